@@ -0,0 +1,217 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+# Contextos de requisicao consultados para descobrir a rota de cada log: o
+# Flask nas APIs sincronas e o Quart na API assincrona (desafio 3)
+REQUEST_CONTEXTS = []
+try:
+    import flask
+    REQUEST_CONTEXTS.append((flask.has_request_context, flask.request))
+except ImportError:
+    pass
+try:
+    import quart
+    REQUEST_CONTEXTS.append((quart.has_request_context, quart.request))
+except ImportError:
+    pass
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', 200))
+# Rotas distintas com janela propria em um mesmo segundo; as demais (ex.:
+# caminhos brutos de uma varredura de 404) dividem uma unica janela
+LOG_RATE_ROUTES = int(os.getenv('LOG_RATE_ROUTES', 100))
+# Espera maxima por espaco na fila para avisos e erros, em segundos
+LOG_BLOCK_TIMEOUT = float(os.getenv('LOG_BLOCK_TIMEOUT', 1))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Atributos padrao de um LogRecord; qualquer outro veio de extra={...}
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'route'}
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        route, rate = item.split('=', 1)
+        rates[route.strip()] = float(rate)
+    return rates
+
+def current_route(record):
+    for has_request_context, request in REQUEST_CONTEXTS:
+        if has_request_context():
+            return request.url_rule.rule if request.url_rule else request.path
+    # Log de acesso do werkzeug: args[0] e a linha "GET /rota HTTP/1.1"
+    if record.name == 'werkzeug' and record.args and isinstance(record.args, tuple):
+        parts = str(record.args[0]).split(' ')
+        if len(parts) > 1:
+            return parts[1].split('?', 1)[0]
+    return None
+
+class SamplingFilter(logging.Filter):
+    # Amostragem e limite de taxa por rota. Avisos e erros sempre passam;
+    # o limite por segundo e aproximado (sem lock) para nao custar nada no
+    # caminho da requisicao
+    def __init__(self, sample_rates=None, rate_limit=LOG_RATE_LIMIT, max_routes=LOG_RATE_ROUTES):
+        super().__init__()
+        self.sample_rates = sorted((sample_rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.rate_limit = rate_limit
+        self.max_routes = max_routes
+        self.second = None
+        self.windows = {}
+        self.suppressed = 0
+
+    def sample_rate(self, route):
+        # "/health" casa apenas a rota exata, "/orders*" casa pelo prefixo e
+        # "*" define a taxa padrao
+        default = 1.0
+        for pattern, rate in self.sample_rates:
+            if pattern == '*':
+                default = rate
+            elif not route:
+                continue
+            elif pattern.endswith('*'):
+                if route.startswith(pattern[:-1]):
+                    return rate
+            elif route == pattern:
+                return rate
+        return default
+
+    def filter(self, record):
+        route = current_route(record)
+        record.route = route
+        if record.levelno >= logging.WARNING:
+            return True
+
+        rate = self.sample_rate(route)
+        if rate < 1.0 and random.random() >= rate:
+            self.suppressed += 1
+            return False
+
+        if self.rate_limit:
+            # So o segundo atual e guardado, e com no maximo max_routes rotas:
+            # caminhos brutos (/tasks/1, /tasks/2, ...) nao acumulam janelas
+            second = int(time.monotonic())
+            if second != self.second:
+                self.second = second
+                self.windows = {}
+            windows = self.windows
+            key = route if route in windows or len(windows) < self.max_routes else None
+            windows[key] = windows.get(key, 0) + 1
+            if windows[key] > self.rate_limit:
+                self.suppressed += 1
+                return False
+        return True
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    # Enfileira o registro sem formata-lo: a mensagem so e montada na thread
+    # de escrita. Com a fila cheia, registros abaixo de WARNING sao
+    # descartados e erros esperam ate LOG_BLOCK_TIMEOUT por espaco; se a
+    # thread de escrita travou, sao escritos direto no stderr, sem prender
+    # a requisicao indefinidamente
+    def __init__(self, log_queue, block_timeout=LOG_BLOCK_TIMEOUT):
+        super().__init__(log_queue)
+        self.block_timeout = block_timeout
+        self.fallback_formatter = logging.Formatter(TEXT_FORMAT)
+        self.dropped = 0
+        self.bypassed = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            # O traceback precisa ser capturado agora, enquanto ainda existe
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if record.levelno >= logging.WARNING:
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                self.bypassed += 1
+                try:
+                    sys.stderr.write(self.fallback_formatter.format(record) + '\n')
+                    sys.stderr.flush()
+                except Exception:
+                    pass
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'service': self.service,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'route', None):
+            entry['route'] = record.route
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class WriterHandler(logging.StreamHandler):
+    # Roda na thread do QueueListener; avisa quando houve descarte na fila
+    def __init__(self, queue_handler, stream=None):
+        super().__init__(stream or sys.stderr)
+        self.queue_handler = queue_handler
+        self.reported_drops = 0
+
+    def emit(self, record):
+        dropped = self.queue_handler.dropped
+        if dropped > self.reported_drops:
+            notice = logging.LogRecord('logs', logging.WARNING, __file__, 0,
+                                       'Fila de logs cheia: %d registros descartados',
+                                       (dropped - self.reported_drops,), None)
+            self.reported_drops = dropped
+            super().emit(notice)
+        super().emit(record)
+
+def setup_logging(service, sample_rates=None, level=LOG_LEVEL, log_format=LOG_FORMAT):
+    rates = dict(sample_rates or {})
+    rates.update(parse_sample_rates(LOG_SAMPLE_RATES))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = AsyncQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(rates))
+
+    writer = WriterHandler(queue_handler)
+    if log_format == 'json':
+        writer.setFormatter(JsonFormatter(service))
+    else:
+        writer.setFormatter(logging.Formatter(TEXT_FORMAT))
+    queue_handler.fallback_formatter = writer.formatter
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,347 @@
+import requests
+import threading
+import time
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+LOAD_WORKERS = int(os.getenv('LOAD_WORKERS', 8))
+LOAD_DURATION = float(os.getenv('LOAD_DURATION', 30))
+LOAD_RATE = float(os.getenv('LOAD_RATE', 0))
+LOAD_TIMEOUT = float(os.getenv('LOAD_TIMEOUT', 3))
+LOAD_RATE_STEP = float(os.getenv('LOAD_RATE_STEP', 0))
+LOAD_RATE_MAX = float(os.getenv('LOAD_RATE_MAX', 0))
+LOAD_SLO_MS = float(os.getenv('LOAD_SLO_MS', 100))
+
+PERCENTILES = [50.0, 90.0, 99.0, 99.9]
+
+class LatencyHistogram:
+    # Histograma log-linear no estilo HDR: valores em microssegundos,
+    # precisao relativa fixa (~2 digitos significativos com 7 bits)
+    def __init__(self, max_value_us=60_000_000, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count // 2
+        self.max_value_us = max_value_us
+        self.counts = [0] * (self._index(max_value_us) + 1)
+        self.total = 0
+        self.min_value = None
+        self.max_value = 0
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.sub_bucket_half + ((value >> shift) - self.sub_bucket_half)
+
+    def _highest_equivalent(self, index):
+        if index < self.sub_bucket_count:
+            return index
+        shift = (index - self.sub_bucket_count) // self.sub_bucket_half + 1
+        sub = (index - self.sub_bucket_count) % self.sub_bucket_half + self.sub_bucket_half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value_us):
+        value_us = min(max(int(value_us), 0), self.max_value_us)
+        self.counts[self._index(value_us)] += 1
+        self.total += 1
+        if self.min_value is None or value_us < self.min_value:
+            self.min_value = value_us
+        if value_us > self.max_value:
+            self.max_value = value_us
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        if other.min_value is not None and (self.min_value is None or other.min_value < self.min_value):
+            self.min_value = other.min_value
+        self.max_value = max(self.max_value, other.max_value)
+
+    def percentile(self, percentile):
+        if self.total == 0:
+            return 0
+        target = max(1, int(round(percentile / 100.0 * self.total + 0.4999)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max_value)
+        return self.max_value
+
+    def count_at_or_below(self, value):
+        return sum(self.counts[:self._index(min(value, self.max_value_us)) + 1])
+
+    def distribution(self, ticks_per_half=5):
+        # Tabela de percentis no formato do HdrHistogram (Value, Percentile,
+        # TotalCount): a resolucao dobra a cada metade restante da distribuicao
+        rows = []
+        if self.total == 0:
+            return rows
+        last_value = None
+        for level in range(32):
+            base = 1.0 - 0.5 ** level
+            step = 0.5 ** (level + 1) / ticks_per_half
+            for tick in range(ticks_per_half):
+                percentile = base + tick * step
+                value = self.percentile(percentile * 100.0)
+                if value != last_value:
+                    rows.append((value, percentile, self.count_at_or_below(value)))
+                    last_value = value
+            if last_value is not None and self.count_at_or_below(last_value) >= self.total:
+                break
+        rows.append((self.max_value, 1.0, self.total))
+        return rows
+
+class WorkerResult:
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.service_histogram = LatencyHistogram()
+        self.success = 0
+        self.errors = {}
+        self.request_numbers = []
+        self.unhealthy = 0
+
+    def add_error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+def build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def send_request(session, url, planned, result):
+    # A latencia e medida a partir do instante planejado de envio: se a
+    # requisicao saiu atrasada (fila, servidor lento), o atraso entra na
+    # medicao em vez de ser omitido (coordinated omission)
+    start = time.perf_counter()
+    try:
+        response = session.get(url, timeout=LOAD_TIMEOUT)
+        end = time.perf_counter()
+        result.histogram.record((end - planned) * 1_000_000)
+        result.service_histogram.record((end - start) * 1_000_000)
+
+        if response.status_code != 200:
+            result.add_error(f"HTTP {response.status_code}")
+            return
+
+        data = response.json()
+        if data.get('status') != 'healthy':
+            result.unhealthy += 1
+        result.request_numbers.append(data['request_number'])
+        result.success += 1
+
+    except requests.exceptions.ConnectionError:
+        result.add_error('conexao')
+    except requests.exceptions.Timeout:
+        end = time.perf_counter()
+        result.histogram.record((end - planned) * 1_000_000)
+        result.service_histogram.record((end - start) * 1_000_000)
+        result.add_error('timeout')
+    except (ValueError, KeyError):
+        result.add_error('resposta invalida')
+    except Exception as e:
+        result.add_error(type(e).__name__)
+
+def run_worker(url, deadline, interval, result, stop_event):
+    session = build_session()
+    next_send = time.perf_counter()
+
+    while not stop_event.is_set():
+        planned = time.perf_counter()
+        if interval:
+            if next_send > planned:
+                time.sleep(next_send - planned)
+            planned = next_send
+            next_send += interval
+        if time.perf_counter() >= deadline:
+            break
+
+        send_request(session, url, planned, result)
+
+    session.close()
+
+def check_counter(request_numbers):
+    # O contador do servidor e global: outros clientes (ex.: o HEALTHCHECK
+    # do container) tambem o incrementam, e cada thread do servidor reserva
+    # blocos de numeros, entao lacunas sao apenas indicativas, enquanto
+    # duplicados sempre indicam problema
+    if not request_numbers:
+        return 0, 0
+    seen = set()
+    duplicated = 0
+    for number in request_numbers:
+        if number in seen:
+            duplicated += 1
+        seen.add(number)
+    distinct = set(request_numbers)
+    expected = max(distinct) - min(distinct) + 1
+    missing = expected - len(distinct)
+    return duplicated, missing
+
+def merge_results(results):
+    merged = WorkerResult()
+    for result in results:
+        merged.histogram.merge(result.histogram)
+        merged.service_histogram.merge(result.service_histogram)
+        merged.success += result.success
+        merged.unhealthy += result.unhealthy
+        merged.request_numbers.extend(result.request_numbers)
+        for kind, count in result.errors.items():
+            merged.errors[kind] = merged.errors.get(kind, 0) + count
+    return merged
+
+def format_percentiles(histogram):
+    return (f"min: {histogram.min_value / 1000:.3f} | "
+            + " | ".join(f"p{p:g}: {histogram.percentile(p) / 1000:.3f}" for p in PERCENTILES)
+            + f" | max: {histogram.max_value / 1000:.3f}")
+
+def report(results, elapsed, workers, rate):
+    merged = merge_results(results)
+    histogram = merged.histogram
+    total_errors = sum(merged.errors.values())
+    total = merged.success + total_errors
+    duplicated, missing = check_counter(merged.request_numbers)
+
+    logger.info("=" * 70)
+    logger.info("RESULTADO DO TESTE DE CARGA")
+    logger.info(f"Workers: {workers} | Taxa alvo: {f'{rate:.1f} req/s' if rate else 'maxima'} | Duracao: {elapsed:.2f}s")
+    logger.info(f"Requisicoes: {total} | Sucesso: {merged.success} | Erros: {total_errors}")
+    for kind, count in sorted(merged.errors.items()):
+        logger.info(f"  Erro {kind}: {count}")
+    logger.info(f"Throughput: {merged.success / elapsed if elapsed else 0:.1f} req/s")
+
+    if histogram.total:
+        logger.info(f"Latencia (ms) - {format_percentiles(histogram)}")
+        logger.info(f"Tempo de servico (ms) - {format_percentiles(merged.service_histogram)}")
+        logger.info(f"{'Value(ms)':>12} {'Percentile':>12} {'TotalCount':>12} {'1/(1-P)':>12}")
+        for value, percentile, count in histogram.distribution():
+            inverse = f"{1 / (1 - percentile):12.2f}" if percentile < 1.0 else f"{'inf':>12}"
+            logger.info(f"{value / 1000:12.3f} {percentile:12.6f} {count:12d} {inverse}")
+
+    logger.info(f"Contador do servidor - respostas nao saudaveis: {merged.unhealthy} | "
+                f"numeros duplicados: {duplicated} | lacunas na sequencia: {missing}")
+    logger.info("=" * 70)
+    return merged
+
+def run_load(url, workers=LOAD_WORKERS, duration=LOAD_DURATION, rate=LOAD_RATE):
+    logger.info(f"Modo carga - Alvo: {url}")
+    logger.info(f"Workers: {workers} | Duracao: {duration}s | Taxa alvo: {rate or 'maxima'}")
+
+    interval = workers / rate if rate else 0
+    results = [WorkerResult() for _ in range(workers)]
+    stop_event = threading.Event()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    threads = [
+        threading.Thread(target=run_worker, args=(url, deadline, interval, results[i], stop_event), daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        logger.info("Teste de carga interrompido pelo usuario")
+        stop_event.set()
+        for thread in threads:
+            thread.join(LOAD_TIMEOUT)
+
+    report(results, time.perf_counter() - start, workers, rate)
+    return results
+
+class StepResults:
+    # Um WorkerResult por thread do pool: o caminho quente grava sem lock,
+    # o lock so e usado na primeira requisicao de cada thread
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.results = []
+
+    def get(self):
+        result = getattr(self.local, 'result', None)
+        if result is None:
+            result = WorkerResult()
+            self.local.result = result
+            with self.lock:
+                self.results.append(result)
+        return result
+
+def open_loop_request(sessions, url, planned, step_results):
+    session = getattr(sessions, 'session', None)
+    if session is None:
+        session = build_session()
+        sessions.session = session
+    send_request(session, url, planned, step_results.get())
+
+def rate_steps(rate, step, max_rate):
+    rates = [rate]
+    if step > 0 and max_rate > rate:
+        while rates[-1] + step <= max_rate:
+            rates.append(rates[-1] + step)
+    return rates
+
+def run_open_loop(url, workers=LOAD_WORKERS, step_duration=LOAD_DURATION, rate=LOAD_RATE,
+                  rate_step=LOAD_RATE_STEP, rate_max=LOAD_RATE_MAX, slo_ms=LOAD_SLO_MS):
+    if rate <= 0:
+        logger.error("Modo carga-aberta exige LOAD_RATE maior que zero")
+        return []
+
+    rates = rate_steps(rate, rate_step, rate_max)
+    logger.info(f"Modo carga-aberta - Alvo: {url}")
+    logger.info(f"Conexoes: {workers} | Degraus: {', '.join(f'{r:g}' for r in rates)} req/s | "
+                f"{step_duration}s por degrau | SLO p99: {slo_ms}ms")
+
+    sessions = threading.local()
+    summary = []
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='carga')
+
+    try:
+        for target in rates:
+            step_results = StepResults()
+            futures = []
+            interval = 1.0 / target
+            total = int(target * step_duration)
+            start = time.perf_counter()
+
+            # Agenda fixa: a requisicao i sai em start + i*intervalo, esteja o
+            # servidor respondendo ou nao; se o pool estiver ocupado ela
+            # espera na fila e esse tempo conta na latencia
+            for i in range(total):
+                planned = start + i * interval
+                now = time.perf_counter()
+                if planned > now:
+                    time.sleep(planned - now)
+                futures.append(executor.submit(open_loop_request, sessions, url, planned, step_results))
+
+            wait(futures)
+            elapsed = time.perf_counter() - start
+
+            merged = report(step_results.results, elapsed, workers, target)
+            achieved = merged.success / elapsed if elapsed else 0
+            p99_ms = merged.histogram.percentile(99.0) / 1000
+            summary.append((target, achieved, p99_ms, sum(merged.errors.values())))
+
+            if achieved < target * 0.95 or p99_ms > slo_ms:
+                logger.info(f"SATURACAO detectada em {target:g} req/s "
+                            f"(vazao {achieved:.1f} req/s, p99 {p99_ms:.3f}ms)")
+                break
+
+    except KeyboardInterrupt:
+        logger.info("Teste de carga interrompido pelo usuario")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.info(f"{'Alvo(req/s)':>12} {'Vazao(req/s)':>13} {'p99(ms)':>10} {'Erros':>8}")
+    for target, achieved, p99_ms, errors in summary:
+        logger.info(f"{target:12g} {achieved:13.1f} {p99_ms:10.3f} {errors:8d}")
+    return summary
@@ -2,6 +2,8 @@ import requests
 import time
 import logging
 import sys
+import os
+import carga
 
 logging.basicConfig(
     level=logging.INFO,
@@ -9,8 +11,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-SERVER_URL = "http://servidor-web:8080/health"
+SERVER_URL = os.getenv('SERVER_URL', "http://servidor-web:8080/health")
 REQUEST_INTERVAL = 5
+CLIENT_MODE = os.getenv('CLIENT_MODE', 'periodico')
 
 def make_request():
     try:
@@ -48,12 +51,27 @@ def main():
     logger.info("Aguardando servidor estar pronto...")
     time.sleep(3)
     
+    if CLIENT_MODE == 'carga':
+        carga.run_load(SERVER_URL)
+        return
+    if CLIENT_MODE == 'carga-aberta':
+        carga.run_open_loop(SERVER_URL)
+        return
+    
+    next_request = time.monotonic()
+    
     while True:
         try:
             request_count += 1
             logger.info(f"[Requisicao #{request_count}]")
             make_request()
-            time.sleep(REQUEST_INTERVAL)
+            
+            next_request += REQUEST_INTERVAL
+            delay = next_request - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_request = time.monotonic()
             
         except KeyboardInterrupt:
             logger.info("Cliente interrompido pelo usuario")
@@ -1,21 +1,30 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, g
 from datetime import datetime
 import logging
+import logs
+import time
+import contador
 
 app = Flask(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logs.setup_logging('servidor-web')
 logger = logging.getLogger(__name__)
 
-request_counter = 0
+metrics = contador.SharedMetrics()
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    route = request.url_rule.rule if request.url_rule else 'outros'
+    metrics.observe(route, time.perf_counter() - g.start_time)
+    return response
 
 @app.route('/health', methods=['GET'])
 def health():
-    global request_counter
-    request_counter += 1
+    request_counter = metrics.increment()
     
     response = {
         'status': 'healthy',
@@ -24,17 +33,22 @@ def health():
         'message': 'Servidor funcionando com sucesso'
     }
     
-    logger.info(f"Verificacao de saude #{request_counter} - Requisicao recebida")
+    logger.info("Verificacao de saude #%s - Requisicao recebida", request_counter)
     return jsonify(response), 200
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify(metrics.snapshot()), 200
+
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
         'service': 'Servidor Flask',
         'version': '1.0',
-        'endpoints': ['/health', '/']
+        'endpoints': ['/health', '/metrics', '/']
     }), 200
 
 if __name__ == '__main__':
     logger.info("Iniciando servidor Flask na porta 8080")
+    metrics.reset()
     app.run(host='0.0.0.0', port=8080, debug=False)
\ No newline at end of file
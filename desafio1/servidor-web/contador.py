@@ -0,0 +1,270 @@
+import mmap
+import os
+import fcntl
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+COUNTER_PATH = os.getenv('COUNTER_PATH', '/dev/shm/servidor-web-contador')
+COUNTER_SLOTS = int(os.getenv('COUNTER_SLOTS', 256))
+# Quantos numeros de requisicao um slot reserva de uma vez na sequencia global
+COUNTER_BLOCK = int(os.getenv('COUNTER_BLOCK', 64))
+
+LATENCY_BUCKETS_MS = [0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+ROUTES = ['/health', '/', '/metrics', 'outros']
+
+MAGIC = 0x4346434450443032
+
+# Cada slot ocupa 64 palavras de 64 bits (512 bytes, multiplo da linha de
+# cache) e tem um unico escritor (uma thread de um processo), por isso os
+# incrementos nao precisam de lock nem disputam a mesma linha de cache:
+#   [0] pid dono | [1] contador de /health
+#   [2 + r*ROUTE_WORDS ...] rota r: quantidade, soma em us, buckets
+#   [62] proximo numero de requisicao do bloco | [63] fim do bloco
+# O slot 0 e o cabecalho: [0] MAGIC | [1] inicio em ns | [2] proximo numero
+# ainda nao reservado da sequencia global de requisicoes
+# O ultimo slot nunca tem dono: quando todos os outros estao ocupados, as
+# threads excedentes (de qualquer processo) escrevem nele sob lock
+SLOT_WORDS = 64
+ROUTE_WORDS = 2 + len(LATENCY_BUCKETS_MS) + 1
+BLOCK_NEXT_WORD = SLOT_WORDS - 2
+BLOCK_END_WORD = SLOT_WORDS - 1
+SEQUENCE_WORD = 2
+
+class _SlotHolder:
+    def __init__(self, slot, pid, shared=False):
+        self.slot = slot
+        self.pid = pid
+        self.shared = shared
+
+class SharedMetrics:
+    def __init__(self, path=COUNTER_PATH, slots=COUNTER_SLOTS, routes=ROUTES):
+        if 2 + len(routes) * ROUTE_WORDS > BLOCK_NEXT_WORD:
+            raise ValueError("Rotas demais para o tamanho do slot")
+
+        self.slots = slots
+        self.routes = routes
+        self.route_index = {route: i for i, route in enumerate(routes)}
+        self.size = (slots + 1) * SLOT_WORDS * 8
+        self.shared_slot = slots
+        # Reentrante: _claim_slot o segura e depois entra em _file_lock
+        self.lock = threading.RLock()
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._file_lock():
+            if os.fstat(self.fd).st_size != self.size:
+                os.ftruncate(self.fd, self.size)
+        self.mm = mmap.mmap(self.fd, self.size)
+        self.words = memoryview(self.mm).cast('Q')
+
+        with self._file_lock():
+            if self.words[0] != MAGIC:
+                self._initialize()
+
+        self.local = threading.local()
+        self.free_slots = []
+        self.pid = os.getpid()
+        self.last_snapshot = None
+
+    @contextmanager
+    def _file_lock(self):
+        # flock so e usado para reservar slots, reiniciar o arquivo e escrever
+        # no slot compartilhado, nunca no caminho normal de cada requisicao.
+        # Ele pertence a descricao de arquivo aberta, que todas as threads do
+        # processo dividem: o lock de thread exclui as threads deste processo
+        # e o flock, os outros processos
+        with self.lock:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _initialize(self):
+        for i in range(len(self.words)):
+            self.words[i] = 0
+        self.words[1] = time.time_ns()
+        self.words[SEQUENCE_WORD] = 1
+        self.words[0] = MAGIC
+
+    def reset(self):
+        with self._file_lock():
+            self._initialize()
+            self.free_slots = []
+            self.local = threading.local()
+
+    def _owner_alive(self, pid):
+        if pid == 0:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _claim_slot(self):
+        # Retorna o slot reservado, ou None se todos estao ocupados
+        with self.lock:
+            pid = os.getpid()
+            if pid != self.pid:
+                # Processo filho apos fork: os slots livres pertencem ao pai
+                self.pid = pid
+                self.free_slots = []
+
+            if self.free_slots:
+                return self.free_slots.pop()
+
+            # Slots de processos encerrados sao reaproveitados com o valor que
+            # ja possuem, assim o total continua exato
+            with self._file_lock():
+                for slot in range(1, self.shared_slot):
+                    base = slot * SLOT_WORDS
+                    if not self._owner_alive(self.words[base]):
+                        self.words[base] = pid
+                        return slot
+        return None
+
+    def _release_slot(self, slot):
+        with self.lock:
+            self.free_slots.append(slot)
+
+    def _holder(self):
+        holder = getattr(self.local, 'holder', None)
+        if holder is None or holder.pid != os.getpid():
+            slot = self._claim_slot()
+            if slot is None:
+                holder = _SlotHolder(self.shared_slot, os.getpid(), shared=True)
+            else:
+                holder = _SlotHolder(slot, os.getpid())
+                # Quando a thread termina seu threading.local e descartado e o
+                # slot volta para a lista de livres deste processo
+                weakref.finalize(holder, self._release_slot, slot)
+            self.local.holder = holder
+        return holder
+
+    def increment(self):
+        # Conta a requisicao e devolve seu numero, unico entre todas as
+        # threads e processos. Os numeros saem de blocos de COUNTER_BLOCK
+        # reservados na sequencia global (hi/lo): o flock so e tomado uma vez
+        # por bloco. Numeros de blocos diferentes nao seguem a ordem de
+        # chegada, e o maior numero pode passar do total de requisicoes em
+        # ate um bloco por slot
+        holder = self._holder()
+        if holder.shared:
+            with self._file_lock():
+                return self._next_number(holder.slot, locked=True)
+        return self._next_number(holder.slot)
+
+    def _next_number(self, slot, locked=False):
+        base = slot * SLOT_WORDS
+        self.words[base + 1] += 1
+        number = self.words[base + BLOCK_NEXT_WORD]
+        if number == self.words[base + BLOCK_END_WORD]:
+            # Um segundo flock na mesma descricao de arquivo o liberaria na
+            # saida, por isso o slot compartilhado reserva sob o lock externo
+            with nullcontext() if locked else self._file_lock():
+                number = self.words[SEQUENCE_WORD]
+                self.words[SEQUENCE_WORD] = number + COUNTER_BLOCK
+            self.words[base + BLOCK_END_WORD] = number + COUNTER_BLOCK
+        self.words[base + BLOCK_NEXT_WORD] = number + 1
+        return number
+
+    def total(self):
+        return sum(self.words[SLOT_WORDS + 1::SLOT_WORDS])
+
+    def observe(self, route, elapsed_seconds):
+        holder = self._holder()
+        if holder.shared:
+            with self._file_lock():
+                self._record(holder.slot, route, elapsed_seconds)
+        else:
+            self._record(holder.slot, route, elapsed_seconds)
+
+    def _record(self, slot, route, elapsed_seconds):
+        route_number = self.route_index.get(route, self.route_index.get('outros', 0))
+        base = slot * SLOT_WORDS + 2 + route_number * ROUTE_WORDS
+        elapsed_ms = elapsed_seconds * 1000
+        self.words[base] += 1
+        self.words[base + 1] += int(elapsed_seconds * 1_000_000)
+        self.words[base + 2 + bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def _route_totals(self, route_number):
+        totals = []
+        for offset in range(ROUTE_WORDS):
+            start = SLOT_WORDS + 2 + route_number * ROUTE_WORDS + offset
+            totals.append(sum(self.words[start::SLOT_WORDS]))
+        return totals[0], totals[1], totals[2:]
+
+    def snapshot(self):
+        now = time.time()
+        started_at = self.words[1] / 1e9
+        uptime = max(now - started_at, 1e-9)
+
+        owners = [self.words[slot * SLOT_WORDS] for slot in range(1, self.slots + 1)]
+        live_owners = {pid for pid in owners if self._owner_alive(pid)}
+
+        counts = {}
+        routes = {}
+        for route_number, route in enumerate(self.routes):
+            count, sum_us, buckets = self._route_totals(route_number)
+            counts[route] = count
+            if count == 0:
+                continue
+
+            cumulative = []
+            seen = 0
+            for value in buckets:
+                seen += value
+                cumulative.append(seen)
+
+            routes[route] = {
+                'count': count,
+                'rate_per_second': round(count / uptime, 3),
+                'latency_ms': {
+                    'avg': round(sum_us / count / 1000, 3),
+                    'p50': estimate_quantile(0.50, cumulative),
+                    'p90': estimate_quantile(0.90, cumulative),
+                    'p99': estimate_quantile(0.99, cumulative)
+                },
+                'histogram': {
+                    **{f'le_{bound:g}': cumulative[i] for i, bound in enumerate(LATENCY_BUCKETS_MS)},
+                    'le_inf': cumulative[-1]
+                }
+            }
+
+        # Taxa recente: diferenca em relacao a consulta anterior deste processo
+        previous = self.last_snapshot
+        self.last_snapshot = (now, counts)
+        if previous:
+            interval = max(now - previous[0], 1e-9)
+            for route, data in routes.items():
+                data['recent_rate_per_second'] = round((counts[route] - previous[1].get(route, 0)) / interval, 3)
+
+        return {
+            'uptime_seconds': round(uptime, 3),
+            'requests_total': self.total(),
+            'processes': len(live_owners),
+            'slots_in_use': sum(1 for pid in owners if pid in live_owners),
+            'routes': routes
+        }
+
+def estimate_quantile(quantile, cumulative):
+    # Interpolacao linear dentro do bucket, como o histogram_quantile do Prometheus
+    total = cumulative[-1]
+    if total == 0:
+        return 0
+    rank = quantile * total
+    previous_count = 0
+    lower = 0.0
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if cumulative[i] >= rank:
+            in_bucket = cumulative[i] - previous_count
+            fraction = (rank - previous_count) / in_bucket if in_bucket else 0
+            return round(lower + (bound - lower) * fraction, 3)
+        previous_count = cumulative[i]
+        lower = bound
+    return LATENCY_BUCKETS_MS[-1]
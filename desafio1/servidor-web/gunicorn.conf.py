@@ -0,0 +1,14 @@
+import os
+import contador
+
+# Varios processos com varias threads cada; o contador em memoria
+# compartilhada (contador.py) continua unico entre todos eles
+bind = '0.0.0.0:8080'
+workers = int(os.getenv('WEB_WORKERS', 4))
+threads = int(os.getenv('WEB_THREADS', 8))
+worker_class = 'gthread'
+
+def on_starting(server):
+    # Uma vez no processo mestre, antes dos workers: o contador recomeca a
+    # cada inicio do servidor, como em "python app.py"
+    contador.SharedMetrics().reset()
@@ -1,6 +1,8 @@
 import logging
 import sys
-from models import get_engine, get_session, Usuario, Produto
+import argparse
+from sqlalchemy import func, select
+from models import get_engine, Usuario, Produto
 
 logging.basicConfig(
     level=logging.INFO,
@@ -8,46 +10,88 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def read_database():
+def format_usuario(row):
+    return f"  [ID: {row.id}] {row.nome} - {row.email} (Criado: {row.data_criacao})"
+
+def format_produto(row):
+    return f"  [ID: {row.id}] {row.nome} - R$ {row.preco:.2f} | Estoque: {row.estoque} (Criado: {row.data_criacao})"
+
+TABLES = {
+    'usuarios': (Usuario, [Usuario.id, Usuario.nome, Usuario.email, Usuario.data_criacao], format_usuario),
+    'produtos': (Produto, [Produto.id, Produto.nome, Produto.preco, Produto.estoque, Produto.data_criacao], format_produto)
+}
+
+def iter_pages(conn, model, columns, since_id=0, limit=None, batch_size=5000):
+    # Paginacao por chave (id > ultimo_id ORDER BY id LIMIT n): cada pagina
+    # usa o indice da chave primaria e so um lote fica em memoria
+    last_id = since_id
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        rows = conn.execute(
+            select(*columns).where(model.id > last_id).order_by(model.id).limit(size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+        if remaining is not None:
+            remaining -= len(rows)
+
+def stream_table(conn, name, since_id=0, limit=None, batch_size=5000, out=sys.stdout):
+    model, columns, formatter = TABLES[name]
+    total = conn.scalar(select(func.count()).select_from(model).where(model.id > since_id))
+
+    logger.info(f">>> {name.upper()} CADASTRADOS ({total} registros):")
+    if total == 0:
+        logger.warning(f"  Nenhum registro em {name} encontrado no banco!")
+        return 0
+
+    written = 0
+    for rows in iter_pages(conn, model, columns, since_id, limit, batch_size):
+        # Uma escrita por lote em vez de uma chamada de log por linha
+        out.write("\n".join(formatter(row) for row in rows))
+        out.write("\n")
+        written += len(rows)
+    out.flush()
+
+    logger.info(f"  {written} registros de {name} exibidos")
+    return total
+
+def read_database(tables=('usuarios', 'produtos'), since_id=0, limit=None, batch_size=5000):
     try:
         logger.info("Conectando ao banco de dados SQLite...")
         engine = get_engine()
-        session = get_session(engine)
-        
+
         logger.info("=" * 70)
         logger.info("LEITURA DE DADOS PERSISTIDOS NO VOLUME")
         logger.info("=" * 70)
-        
-        usuarios = session.query(Usuario).order_by(Usuario.id).all()
-        
-        logger.info(f"\n>>> USUARIOS CADASTRADOS ({len(usuarios)} registros):")
-        if len(usuarios) == 0:
-            logger.warning("  Nenhum usuario encontrado no banco!")
-        else:
-            for user in usuarios:
-                logger.info(f"  [ID: {user.id}] {user.nome} - {user.email} (Criado: {user.data_criacao})")
-        
-        produtos = session.query(Produto).order_by(Produto.id).all()
-        
-        logger.info(f"\n>>> PRODUTOS CADASTRADOS ({len(produtos)} registros):")
-        if len(produtos) == 0:
-            logger.warning("  Nenhum produto encontrado no banco!")
-        else:
-            for produto in produtos:
-                logger.info(f"  [ID: {produto.id}] {produto.nome} - R$ {produto.preco:.2f} | Estoque: {produto.estoque} (Criado: {produto.data_criacao})")
-        
-        logger.info("\n" + "=" * 70)
-        if len(usuarios) > 0 or len(produtos) > 0:
+
+        found = 0
+        with engine.connect() as conn:
+            for name in tables:
+                found += stream_table(conn, name, since_id, limit, batch_size)
+
+        logger.info("=" * 70)
+        if found > 0:
             logger.info("COMPROVACAO: Dados foram recuperados do volume persistente!")
         else:
             logger.info("Banco de dados vazio. Execute o script de populacao primeiro.")
         logger.info("=" * 70)
-        
-        session.close()
-        
+
     except Exception as e:
         logger.error(f"Erro ao ler dados: {str(e)}")
         sys.exit(1)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Le os dados persistidos do desafio 2")
+    parser.add_argument('--table', choices=['usuarios', 'produtos', 'todas'], default='todas')
+    parser.add_argument('--limit', type=int, default=None, help="maximo de linhas por tabela")
+    parser.add_argument('--since-id', type=int, default=0, help="le apenas ids maiores que este")
+    parser.add_argument('--batch-size', type=int, default=5000, help="linhas por pagina/escrita")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    read_database()
\ No newline at end of file
+    args = parse_args()
+    tables = ('usuarios', 'produtos') if args.table == 'todas' else (args.table,)
+    read_database(tables, args.since_id, args.limit, args.batch_size)
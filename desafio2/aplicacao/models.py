@@ -1,39 +1,87 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Index
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import os
 
 Base = declarative_base()
 
+DB_PATH = os.getenv('DB_PATH', '/data/desafio2.db')
+
+# Aplicados em cada nova conexao. Com WAL, leitores (app-ler) nao bloqueiam
+# o escritor (app-popular) e vice-versa, e synchronous=NORMAL faz fsync so
+# nos checkpoints em vez de a cada commit
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -65536)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+}
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 5))
+
 class Usuario(Base):
     __tablename__ = 'usuarios'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False)
-    data_criacao = Column(DateTime, default=datetime.now)
+    data_criacao = Column(DateTime, default=datetime.now, index=True)
     
     def __repr__(self):
         return f"<Usuario(id={self.id}, nome='{self.nome}', email='{self.email}')>"
 
 class Produto(Base):
     __tablename__ = 'produtos'
+    # (estoque, preco) atende o filtro de estoque baixo e cobre o calculo do
+    # valor total do inventario sem ler a tabela
+    __table_args__ = (Index('ix_produtos_estoque_preco', 'estoque', 'preco'),)
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     nome = Column(String(100), nullable=False)
     preco = Column(Float, nullable=False)
     estoque = Column(Integer, default=0)
-    data_criacao = Column(DateTime, default=datetime.now)
+    data_criacao = Column(DateTime, default=datetime.now, index=True)
     
     def __repr__(self):
         return f"<Produto(id={self.id}, nome='{self.nome}', preco={self.preco})>"
 
-def get_engine(db_path='/data/desafio2.db'):
-    return create_engine(f'sqlite:///{db_path}', echo=False)
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+def get_engine(db_path=DB_PATH, pool_size=SQLITE_POOL_SIZE, pragmas=None):
+    if db_path == ':memory:':
+        # Banco em memoria existe apenas dentro de uma conexao: todas as
+        # threads precisam compartilhar a mesma
+        engine = create_engine(
+            'sqlite://', echo=False, poolclass=StaticPool,
+            connect_args={'check_same_thread': False}
+        )
+    else:
+        # Arquivo em disco: um pool de conexoes reutilizaveis entre threads,
+        # cada uma com os pragmas ja aplicados
+        engine = create_engine(
+            f'sqlite:///{db_path}', echo=False, poolclass=QueuePool,
+            pool_size=pool_size, max_overflow=pool_size,
+            connect_args={'check_same_thread': False}
+        )
+    settings = {**SQLITE_PRAGMAS, **(pragmas or {})}
+    event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, settings))
+    return engine
 
 def get_session(engine):
     Session = sessionmaker(bind=engine)
     return Session()
 
 def init_database(engine):
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    Base.metadata.create_all(engine)
+    # create_all ignora tabelas que ja existem, inclusive seus indices: bancos
+    # criados por versoes anteriores recebem os indices novos aqui
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
\ No newline at end of file
@@ -1,7 +1,15 @@
 import logging
 import sys
-from datetime import datetime
-from models import get_engine, get_session, init_database, Usuario, Produto
+import time
+import random
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from models import get_engine, get_session, init_database, Usuario, Produto, DB_PATH
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,10 +36,11 @@ def populate_database():
         ]
         
         logger.info("Inserindo usuarios no banco de dados...")
+        emails = [email for _, email in usuarios_data]
+        existentes = set(session.scalars(select(Usuario.email).where(Usuario.email.in_(emails))))
         usuarios_inseridos = 0
         for nome, email in usuarios_data:
-            existing = session.query(Usuario).filter_by(email=email).first()
-            if not existing:
+            if email not in existentes:
                 usuario = Usuario(nome=nome, email=email)
                 session.add(usuario)
                 usuarios_inseridos += 1
@@ -63,7 +72,7 @@ def populate_database():
         logger.info(f"Total de usuarios no banco: {total_usuarios}")
         logger.info(f"Total de produtos no banco: {total_produtos}")
         logger.info(f"Timestamp da insercao: {datetime.now().isoformat()}")
-        logger.info(f"Arquivo do banco: /data/desafio2.db")
+        logger.info(f"Arquivo do banco: {DB_PATH}")
         logger.info("=" * 70)
         
         session.close()
@@ -72,5 +81,226 @@ def populate_database():
         logger.error(f"Erro ao popular banco de dados: {str(e)}")
         sys.exit(1)
 
+FIRST_NAMES = ['Joao', 'Maria', 'Pedro', 'Ana', 'Carlos', 'Julia', 'Lucas', 'Beatriz', 'Rafael', 'Fernanda']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Costa', 'Souza', 'Lima', 'Pereira', 'Almeida', 'Ribeiro', 'Gomes']
+PRODUCT_NAMES = ['Notebook', 'Mouse', 'Teclado', 'Monitor', 'Webcam', 'Headset', 'SSD', 'Cadeira', 'Impressora', 'Roteador']
+BRANDS = ['Dell', 'Logitech', 'LG', 'Samsung', 'HP', 'Lenovo', 'Asus', 'Acer', 'Kingston', 'TP-Link']
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def generate_usuarios(total, offset=0, seed=42):
+    # Emails derivados do indice: reexecutar com o mesmo offset gera os
+    # mesmos emails, que sao ignorados pelo ON CONFLICT
+    rng = random.Random(seed + offset)
+    now = datetime.now()
+    for i in range(offset, offset + total):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        last = LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        yield {
+            'nome': f"{first} {last}",
+            'email': f"{first.lower()}.{last.lower()}.{i}@email.com",
+            'data_criacao': now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        }
+
+def generate_produtos(total, seed=42, offset=0):
+    rng = random.Random(seed + offset)
+    now = datetime.now()
+    for i in range(offset, offset + total):
+        yield {
+            'nome': f"{PRODUCT_NAMES[i % len(PRODUCT_NAMES)]} {BRANDS[rng.randrange(len(BRANDS))]} {i}",
+            'preco': round(rng.uniform(10, 5000), 2),
+            'estoque': rng.randrange(0, 500),
+            'data_criacao': now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        }
+
+def bulk_insert(engine, statement, rows, batch_size, label):
+    # Um executemany por lote, com commit por lote: memoria constante e
+    # nenhuma consulta por linha
+    processed = 0
+    start = time.perf_counter()
+    for batch in chunked(rows, batch_size):
+        with engine.begin() as conn:
+            conn.execute(statement, batch)
+        processed += len(batch)
+        elapsed = time.perf_counter() - start
+        if processed % (batch_size * 10) == 0:
+            logger.info(f"  {label}: {processed} linhas processadas ({processed / elapsed:,.0f} linhas/s)")
+    return processed, time.perf_counter() - start
+
+def count_rows(engine, model):
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(model))
+
+def populate_bulk(total_usuarios, total_produtos, batch_size=10000, offset=0):
+    try:
+        logger.info("Iniciando carga em massa no banco de dados SQLite...")
+        engine = get_engine()
+        init_database(engine)
+
+        usuarios_antes = count_rows(engine, Usuario)
+
+        # Emails duplicados sao resolvidos pelo proprio banco, em uma unica
+        # etapa por lote, usando o indice UNIQUE de email
+        usuarios_stmt = insert(Usuario).on_conflict_do_nothing(index_elements=['email'])
+        logger.info(f"Inserindo {total_usuarios} usuarios em lotes de {batch_size}...")
+        usuarios_processados, usuarios_tempo = bulk_insert(
+            engine, usuarios_stmt, generate_usuarios(total_usuarios, offset), batch_size, 'usuarios'
+        )
+        usuarios_inseridos = count_rows(engine, Usuario) - usuarios_antes
+
+        logger.info(f"Inserindo {total_produtos} produtos em lotes de {batch_size}...")
+        produtos_inseridos, produtos_tempo = bulk_insert(
+            engine, insert(Produto), generate_produtos(total_produtos, seed=42 + offset), batch_size, 'produtos'
+        )
+
+        logger.info("=" * 70)
+        logger.info("CARGA EM MASSA CONCLUIDA!")
+        logger.info(f"Usuarios processados: {usuarios_processados} | inseridos: {usuarios_inseridos} | "
+                    f"ignorados (email duplicado): {usuarios_processados - usuarios_inseridos} | "
+                    f"{usuarios_processados / usuarios_tempo if usuarios_tempo else 0:,.0f} linhas/s")
+        logger.info(f"Produtos inseridos: {produtos_inseridos} | "
+                    f"{produtos_inseridos / produtos_tempo if produtos_tempo else 0:,.0f} linhas/s")
+        logger.info(f"Total de usuarios no banco: {count_rows(engine, Usuario)}")
+        logger.info(f"Total de produtos no banco: {count_rows(engine, Produto)}")
+        logger.info(f"Arquivo do banco: {DB_PATH}")
+        logger.info("=" * 70)
+
+    except Exception as e:
+        logger.error(f"Erro na carga em massa: {str(e)}")
+        sys.exit(1)
+
+# Shards sao descartaveis: sem journal e sem fsync, o custo de escrita e
+# apenas o de gerar e codificar as linhas
+SHARD_PRAGMAS = {'journal_mode': 'OFF', 'synchronous': 'OFF'}
+
+def split_range(total, parts, start=0):
+    size, extra = divmod(total, parts)
+    ranges = []
+    for part in range(parts):
+        length = size + (1 if part < extra else 0)
+        ranges.append((start, length))
+        start += length
+    return ranges
+
+def populate_shard(shard_path, usuarios_range, produtos_range, batch_size):
+    # Executa em um processo do pool: cada worker escreve no proprio arquivo,
+    # sem disputar o lock de escrita do banco principal
+    if os.path.exists(shard_path):
+        os.remove(shard_path)
+    engine = get_engine(shard_path, pool_size=1, pragmas=SHARD_PRAGMAS)
+    init_database(engine)
+    # Os indices secundarios so importam no banco principal
+    for table in (Usuario.__table__, Produto.__table__):
+        for index in table.indexes:
+            index.drop(engine)
+
+    usuarios_offset, usuarios_total = usuarios_range
+    produtos_offset, produtos_total = produtos_range
+    start = time.perf_counter()
+    bulk_insert(engine, insert(Usuario), generate_usuarios(usuarios_total, usuarios_offset), batch_size, 'usuarios')
+    bulk_insert(engine, insert(Produto), generate_produtos(produtos_total, offset=produtos_offset), batch_size, 'produtos')
+    engine.dispose()
+    return shard_path, usuarios_total + produtos_total, time.perf_counter() - start
+
+def merge_shard(engine, shard_path):
+    # Os ids nao sao copiados: o banco principal atribui novos ids em
+    # sequencia. Emails que ja existem no banco principal sao ignorados.
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+        cursor.execute(
+            "INSERT OR IGNORE INTO usuarios (nome, email, data_criacao) "
+            "SELECT nome, email, data_criacao FROM shard.usuarios ORDER BY id"
+        )
+        usuarios = cursor.rowcount
+        cursor.execute(
+            "INSERT INTO produtos (nome, preco, estoque, data_criacao) "
+            "SELECT nome, preco, estoque, data_criacao FROM shard.produtos ORDER BY id"
+        )
+        produtos = cursor.rowcount
+        raw.commit()
+        cursor.execute("DETACH DATABASE shard")
+        cursor.close()
+        return usuarios, produtos
+    finally:
+        raw.close()
+
+def populate_parallel(total_usuarios, total_produtos, workers, batch_size=10000, offset=0):
+    try:
+        logger.info(f"Iniciando carga paralela com {workers} processos...")
+        engine = get_engine()
+        init_database(engine)
+
+        shard_dir = os.path.join(os.path.dirname(DB_PATH), 'shards')
+        os.makedirs(shard_dir, exist_ok=True)
+        shard_paths = [os.path.join(shard_dir, f"shard-{i}.db") for i in range(workers)]
+        # Faixas de indices disjuntas: emails sinteticos nunca colidem entre shards
+        usuarios_ranges = split_range(total_usuarios, workers, offset)
+        produtos_ranges = split_range(total_produtos, workers, offset)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(populate_shard, path, usuarios_ranges[i], produtos_ranges[i], batch_size)
+                for i, path in enumerate(shard_paths)
+            ]
+            for future in futures:
+                path, rows, elapsed = future.result()
+                logger.info(f"  Shard {os.path.basename(path)}: {rows} linhas em {elapsed:.2f}s "
+                            f"({rows / elapsed if elapsed else 0:,.0f} linhas/s)")
+        generation_time = time.perf_counter() - start
+
+        logger.info("Mesclando shards no banco principal (ATTACH + INSERT ... SELECT)...")
+        merge_start = time.perf_counter()
+        usuarios_inseridos = 0
+        produtos_inseridos = 0
+        for path in shard_paths:
+            usuarios, produtos = merge_shard(engine, path)
+            usuarios_inseridos += usuarios
+            produtos_inseridos += produtos
+            os.remove(path)
+        merge_time = time.perf_counter() - merge_start
+        total_time = time.perf_counter() - start
+        total_rows = total_usuarios + total_produtos
+
+        logger.info("=" * 70)
+        logger.info("CARGA PARALELA CONCLUIDA!")
+        logger.info(f"Geracao em {workers} processos: {generation_time:.2f}s | Mesclagem: {merge_time:.2f}s")
+        logger.info(f"Usuarios inseridos: {usuarios_inseridos} | ignorados (email duplicado): "
+                    f"{total_usuarios - usuarios_inseridos}")
+        logger.info(f"Produtos inseridos: {produtos_inseridos}")
+        logger.info(f"Vazao total: {total_rows / total_time if total_time else 0:,.0f} linhas/s")
+        logger.info(f"Total de usuarios no banco: {count_rows(engine, Usuario)}")
+        logger.info(f"Total de produtos no banco: {count_rows(engine, Produto)}")
+        logger.info(f"Arquivo do banco: {DB_PATH}")
+        logger.info("=" * 70)
+
+    except Exception as e:
+        logger.error(f"Erro na carga paralela: {str(e)}")
+        sys.exit(1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Popula o banco de dados do desafio 2")
+    parser.add_argument('--bulk', action='store_true', help="carga em massa com dados sinteticos")
+    parser.add_argument('--users', type=int, default=1_000_000, help="usuarios sinteticos (modo --bulk)")
+    parser.add_argument('--products', type=int, default=1_000_000, help="produtos sinteticos (modo --bulk)")
+    parser.add_argument('--batch-size', type=int, default=10000, help="linhas por lote/commit")
+    parser.add_argument('--offset', type=int, default=0, help="indice inicial dos emails sinteticos")
+    parser.add_argument('--workers', type=int, default=1, help="processos paralelos, cada um com seu shard (modo --bulk)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    populate_database()
\ No newline at end of file
+    args = parse_args()
+    if args.bulk and args.workers > 1:
+        populate_parallel(args.users, args.products, args.workers, args.batch_size, args.offset)
+    elif args.bulk:
+        populate_bulk(args.users, args.products, args.batch_size, args.offset)
+    else:
+        populate_database()
@@ -0,0 +1,100 @@
+import logging
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from models import get_engine, init_database, Usuario, Produto
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Todas as agregacoes rodam no SQLite; apenas o resultado (algumas linhas)
+# chega ao Python
+
+def inventory_value(conn):
+    row = conn.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(Produto.estoque), 0),
+            func.coalesce(func.sum(Produto.preco * Produto.estoque), 0.0)
+        )
+    ).one()
+    return {'produtos': row[0], 'itens_em_estoque': row[1], 'valor_total': round(row[2], 2)}
+
+def low_stock_products(conn, threshold=10, limit=20):
+    rows = conn.execute(
+        select(Produto.id, Produto.nome, Produto.preco, Produto.estoque)
+        .where(Produto.estoque < threshold)
+        .order_by(Produto.estoque, Produto.id)
+        .limit(limit)
+    ).all()
+    total = conn.scalar(select(func.count()).where(Produto.estoque < threshold))
+    return total, rows
+
+def created_per_day(conn, model, days=30):
+    # O filtro por data usa o indice de data_criacao; o agrupamento percorre
+    # apenas a faixa do indice correspondente ao periodo
+    since = datetime.now() - timedelta(days=days)
+    day = func.date(model.data_criacao)
+    return conn.execute(
+        select(day.label('dia'), func.count().label('total'))
+        .where(model.data_criacao >= since)
+        .group_by(day)
+        .order_by(day)
+    ).all()
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    logger.info(f"  ({label}: {(time.perf_counter() - start) * 1000:.1f}ms)")
+    return result
+
+def generate_report(threshold=10, limit=20, days=30):
+    try:
+        engine = get_engine()
+        init_database(engine)
+
+        logger.info("=" * 70)
+        logger.info("RELATORIO DE DADOS PERSISTIDOS NO VOLUME")
+        logger.info("=" * 70)
+
+        with engine.connect() as conn:
+            logger.info(">>> VALOR TOTAL DO INVENTARIO:")
+            inventory = timed('inventario', inventory_value, conn)
+            logger.info(f"  Produtos: {inventory['produtos']} | Itens em estoque: {inventory['itens_em_estoque']} | "
+                        f"Valor total: R$ {inventory['valor_total']:,.2f}")
+
+            logger.info(f">>> PRODUTOS COM ESTOQUE ABAIXO DE {threshold}:")
+            total, rows = timed('estoque baixo', low_stock_products, conn, threshold, limit)
+            logger.info(f"  {total} produtos com estoque baixo (exibindo ate {limit}):")
+            for row in rows:
+                logger.info(f"  [ID: {row.id}] {row.nome} - R$ {row.preco:.2f} | Estoque: {row.estoque}")
+
+            for label, model in (('USUARIOS', Usuario), ('PRODUTOS', Produto)):
+                logger.info(f">>> {label} CRIADOS POR DIA (ultimos {days} dias):")
+                rows = timed(f'{label.lower()} por dia', created_per_day, conn, model, days)
+                if not rows:
+                    logger.info("  Nenhum registro no periodo")
+                for row in rows:
+                    logger.info(f"  {row.dia}: {row.total}")
+
+        logger.info("=" * 70)
+
+    except Exception as e:
+        logger.error(f"Erro ao gerar relatorio: {str(e)}")
+        sys.exit(1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Relatorio agregado dos dados do desafio 2")
+    parser.add_argument('--low-stock', type=int, default=10, help="limite de estoque baixo")
+    parser.add_argument('--limit', type=int, default=20, help="produtos de estoque baixo exibidos")
+    parser.add_argument('--days', type=int, default=30, help="periodo da contagem diaria")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    generate_report(args.low_stock, args.limit, args.days)
@@ -0,0 +1,298 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from models import get_engine, Usuario, Produto, DB_PATH
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', os.path.splitext(DB_PATH)[0] + '.snap')
+
+# Formato do snapshot (little/big endian conforme a maquina que exportou):
+#   MAGIC (8 bytes) | tamanho do cabecalho (uint64) | cabecalho JSON
+#   | buffers das colunas, cada um alinhado em 8 bytes
+# Colunas numericas sao arrays tipados (int64/float64); timestamps sao int64
+# em microssegundos desde 1970; strings sao um array de offsets int64
+# (linhas + 1) mais um heap UTF-8 contiguo. Os offsets do cabecalho sao
+# relativos ao inicio da area de dados.
+MAGIC = b'D2SNAP01'
+ALIGNMENT = 8
+NULL_INT = -(2 ** 63)
+EPOCH = datetime(1970, 1, 1)
+
+TYPECODES = {'int64': 'q', 'float64': 'd', 'timestamp': 'q'}
+
+SCHEMA = {
+    'usuarios': (Usuario, [('id', 'int64'), ('nome', 'string'), ('email', 'string'), ('data_criacao', 'timestamp')]),
+    'produtos': (Produto, [('id', 'int64'), ('nome', 'string'), ('preco', 'float64'),
+                           ('estoque', 'int64'), ('data_criacao', 'timestamp')])
+}
+
+def to_micros(value):
+    if value is None:
+        return NULL_INT
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+def from_micros(value):
+    if value == NULL_INT:
+        return None
+    return EPOCH + timedelta(microseconds=value)
+
+class ColumnWriter:
+    # Cada coluna e acumulada em arquivos temporarios, entao a exportacao
+    # usa memoria constante independente do tamanho da tabela
+    def __init__(self, name, kind, directory):
+        self.name = name
+        self.kind = kind
+        self.data = tempfile.TemporaryFile(dir=directory)
+        if kind == 'string':
+            self.heap = tempfile.TemporaryFile(dir=directory)
+            self.heap_size = 0
+            self.data.write(array('q', [0]).tobytes())
+
+    def append(self, values):
+        if self.kind == 'string':
+            encoded = [(value or '').encode('utf-8') for value in values]
+            offsets = array('q')
+            for item in encoded:
+                self.heap_size += len(item)
+                offsets.append(self.heap_size)
+            self.data.write(offsets.tobytes())
+            self.heap.write(b''.join(encoded))
+        elif self.kind == 'timestamp':
+            self.data.write(array('q', [to_micros(value) for value in values]).tobytes())
+        elif self.kind == 'float64':
+            self.data.write(array('d', [float('nan') if value is None else value for value in values]).tobytes())
+        else:
+            self.data.write(array('q', [NULL_INT if value is None else value for value in values]).tobytes())
+
+    def buffers(self):
+        files = {'data': self.data}
+        if self.kind == 'string':
+            files = {'offsets': self.data, 'heap': self.heap}
+        return files
+
+    def close(self):
+        for handle in self.buffers().values():
+            handle.close()
+
+def align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def export_snapshot(output=SNAPSHOT_PATH, batch_size=50000):
+    engine = get_engine()
+    directory = os.path.dirname(os.path.abspath(output))
+    header = {'version': 1, 'byteorder': sys.byteorder, 'created_at': datetime.now().isoformat(), 'tables': {}}
+    writers = []
+
+    try:
+        with engine.connect() as conn:
+            for table, (model, columns) in SCHEMA.items():
+                table_writers = [ColumnWriter(name, kind, directory) for name, kind in columns]
+                writers.extend(table_writers)
+                selected = [getattr(model, name) for name, _ in columns]
+                rows = 0
+                last_id = 0
+                start = time.perf_counter()
+
+                # Paginacao por chave, uma transposicao linha -> coluna por lote
+                while True:
+                    batch = conn.execute(
+                        select(*selected).where(model.id > last_id).order_by(model.id).limit(batch_size)
+                    ).all()
+                    if not batch:
+                        break
+                    for index, writer in enumerate(table_writers):
+                        writer.append([row[index] for row in batch])
+                    rows += len(batch)
+                    last_id = batch[-1][0]
+
+                header['tables'][table] = {'rows': rows, 'columns': table_writers}
+                logger.info(f"  {table}: {rows} linhas lidas em {time.perf_counter() - start:.2f}s")
+
+        # Layout final: so agora os tamanhos de todos os buffers sao conhecidos
+        position = 0
+        layout = []
+        for table, info in header['tables'].items():
+            described = []
+            for writer in info['columns']:
+                column = {'name': writer.name, 'type': writer.kind}
+                for buffer_name, handle in writer.buffers().items():
+                    length = handle.seek(0, os.SEEK_END)
+                    column[buffer_name] = [position, length]
+                    layout.append((position, handle, length))
+                    position = align(position + length)
+                described.append(column)
+            info['columns'] = described
+
+        encoded = json.dumps(header).encode('utf-8')
+        encoded += b' ' * (align(len(MAGIC) + 8 + len(encoded)) - (len(MAGIC) + 8 + len(encoded)))
+
+        temporary = output + '.tmp'
+        with open(temporary, 'wb') as out:
+            out.write(MAGIC)
+            out.write(struct.pack('<Q', len(encoded)))
+            out.write(encoded)
+            data_start = out.tell()
+            for offset, handle, length in layout:
+                out.write(b'\0' * (data_start + offset - out.tell()))
+                handle.seek(0)
+                shutil.copyfileobj(handle, out, 1024 * 1024)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary, output)
+        return header
+
+    finally:
+        for writer in writers:
+            writer.close()
+
+class StringColumn:
+    # Visao sobre offsets + heap: nenhuma string e criada ate ser acessada
+    def __init__(self, offsets, heap):
+        self.offsets = offsets
+        self.heap = heap
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return bytes(self.heap[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+class SnapshotTable:
+    def __init__(self, name, rows, columns):
+        self.name = name
+        self.rows = rows
+        self.columns = columns
+
+    def column(self, name):
+        return self.columns[name]
+
+    def numpy(self, name):
+        # Opcional: com numpy instalado, a mesma memoria vira um ndarray
+        import numpy
+        view = self.columns[name]
+        dtype = {'q': numpy.int64, 'd': numpy.float64}[view.format]
+        return numpy.frombuffer(view, dtype=dtype)
+
+class Snapshot:
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mm)
+        self.views = []
+
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError(f"Arquivo {path} nao e um snapshot do desafio 2")
+        header_size = struct.unpack_from('<Q', self.mm, len(MAGIC))[0]
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(self.buffer[start:start + header_size]))
+        if self.header['byteorder'] != sys.byteorder:
+            self.close()
+            raise ValueError("Snapshot exportado em maquina com outra ordem de bytes")
+        self.data_start = start + header_size
+
+        self.tables = {}
+        for name, info in self.header['tables'].items():
+            columns = {}
+            for column in info['columns']:
+                if column['type'] == 'string':
+                    columns[column['name']] = StringColumn(self._view(column['offsets'], 'q'), self._view(column['heap']))
+                else:
+                    columns[column['name']] = self._view(column['data'], TYPECODES[column['type']])
+            self.tables[name] = SnapshotTable(name, info['rows'], columns)
+
+    def _view(self, location, typecode=None):
+        offset, length = location
+        view = self.buffer[self.data_start + offset:self.data_start + offset + length]
+        self.views.append(view)
+        if typecode:
+            view = view.cast(typecode)
+            self.views.append(view)
+        return view
+
+    def table(self, name):
+        return self.tables[name]
+
+    def close(self):
+        # Todas as visoes precisam ser liberadas antes de fechar o mmap; depois
+        # disso, colunas obtidas deste snapshot deixam de ser validas. Arrays
+        # de numpy() ainda vivos prendem a memoria (release gera BufferError):
+        # nesse caso o mmap fica aberto e e liberado pelo GC junto com eles
+        self.tables = {}
+        try:
+            for view in reversed(self.views):
+                view.release()
+            self.buffer.release()
+            self.mm.close()
+        except BufferError:
+            logger.debug("Snapshot ainda referenciado por arrays numpy; mmap liberado pelo GC")
+        self.views = []
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def show_info(path):
+    start = time.perf_counter()
+    with Snapshot(path) as snapshot:
+        logger.info(f"Snapshot {path} aberto em {(time.perf_counter() - start) * 1000:.2f}ms "
+                    f"(criado em {snapshot.header['created_at']})")
+        for name, table in snapshot.tables.items():
+            logger.info(f">>> {name.upper()}: {table.rows} linhas | colunas: {', '.join(table.columns)}")
+            if table.rows:
+                logger.info("  Primeira linha: " + " | ".join(
+                    f"{column}={from_micros(view[0]) if column == 'data_criacao' else view[0]}"
+                    for column, view in table.columns.items()
+                ))
+
+        produtos = snapshot.table('produtos')
+        if produtos.rows:
+            start = time.perf_counter()
+            total_estoque = sum(produtos.column('estoque'))
+            logger.info(f"  Varredura da coluna estoque: {total_estoque} itens em "
+                        f"{(time.perf_counter() - start) * 1000:.1f}ms")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Snapshot colunar dos dados do desafio 2")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export_parser = subparsers.add_parser('export', help="exporta usuarios e produtos")
+    export_parser.add_argument('--output', default=SNAPSHOT_PATH)
+    export_parser.add_argument('--batch-size', type=int, default=50000)
+    info_parser = subparsers.add_parser('info', help="abre o snapshot via mmap e resume o conteudo")
+    info_parser.add_argument('--input', default=SNAPSHOT_PATH)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        if args.command == 'export':
+            logger.info(f"Exportando snapshot colunar para {args.output}...")
+            start = time.perf_counter()
+            export_snapshot(args.output, args.batch_size)
+            logger.info(f"Snapshot gravado: {os.path.getsize(args.output) / 1024 / 1024:.1f} MB "
+                        f"em {time.perf_counter() - start:.2f}s")
+        else:
+            show_info(args.input)
+    except Exception as e:
+        logger.error(f"Erro no snapshot: {str(e)}")
+        sys.exit(1)
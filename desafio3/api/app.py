@@ -1,59 +1,198 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 import logging
+import logs
+import codec
+import os
+import threading
 import time
+import metrics
 import models
 import cache
-from datetime import datetime
+from contract import (
+    CACHE_WARMUP_PAGES, CACHE_WARMUP_TASKS, ENDPOINTS, EXPORT_FORMATS, TASK_COLUMNS, TASK_ITEMS_NAMESPACE,
+    TASKS_NAMESPACE, TASKS_PAGE_SIZE, TASKS_SEARCH_CACHE_TTL, changed_task_namespaces, encode_export,
+    page_cache_key, page_payload, parse_batch, parse_batch_ids, parse_export_args, parse_page_args,
+    parse_search_args, render_body, response_body, search_cache_key, search_payload, serialize_task, task_key,
+    task_namespaces
+)
 
 app = Flask(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logs.setup_logging('api-web')
 logger = logging.getLogger(__name__)
 
-def serialize_task(task):
-    if not task:
+def task_cache_key(task_id):
+    # Versionada pela geracao da propria task: um valor lido do banco antes de
+    # uma escrita e gravado depois da invalidacao fica em uma chave antiga,
+    # que ninguem mais le
+    return cache.versioned_key(task_key(task_id), *task_namespaces(task_id))
+
+def invalidate_tasks(task_ids=(), txid=None):
+    # Uma invalidacao por escrita ou lote: paginas e buscas caem com o INCR
+    # da geracao de tasks, e cada task alterada com o da sua. O txid da
+    # escrita marca a notificacao do COMMIT como ja tratada
+    cache.bump_generations([TASKS_NAMESPACE] + changed_task_namespaces(task_ids),
+                           claims=[txid] if txid is not None else ())
+
+def apply_task_changes(notifications):
+    # Chamada pelo listener de cada processo para alteracoes feitas fora da
+    # API; so quem registra a notificacao primeiro invalida o Redis. ids None:
+    # alteracao sem lista de ids
+    owned = cache.claim_notifications([token for token, _ in notifications])
+    changes = [ids for token, ids in notifications if token in owned]
+    if not changes:
+        return
+    if None in changes:
+        resync_tasks()
+    else:
+        invalidate_tasks(set().union(*changes))
+
+_warmup_lock = threading.Lock()
+# ready passa a True no fim da primeira tentativa de aquecimento e libera o
+# /health
+_warmup = {'ready': False, 'status': 'pending', 'pages': 0, 'tasks': 0, 'duration_ms': None}
+
+def warm_cache():
+    # Grava no Redis, em um unico pipeline, as primeiras CACHE_WARMUP_PAGES
+    # paginas de GET /tasks e as CACHE_WARMUP_TASKS tasks alteradas mais
+    # recentemente, com as mesmas chaves e corpos de uma requisicao. Retorna
+    # True se o aquecimento terminou sem erro
+    with _warmup_lock:
+        _warmup['status'] = 'running'
+        start = time.perf_counter()
+        try:
+            entries = []
+            # Toda escrita troca a geracao de tasks: a chave da primeira
+            # pagina, montada antes e depois das consultas, mostra se alguma
+            # escrita aconteceu no meio
+            first_page = page_cache_key(None, TASK_COLUMNS, TASKS_PAGE_SIZE, None)
+            before = cache.versioned_key(first_page, TASKS_NAMESPACE)
+            after = cursor = None
+            for _ in range(CACHE_WARMUP_PAGES):
+                key = cache.versioned_key(page_cache_key(None, TASK_COLUMNS, TASKS_PAGE_SIZE, cursor), TASKS_NAMESPACE)
+                tasks, has_more = models.get_tasks_page(TASKS_PAGE_SIZE, after)
+                payload = page_payload(tasks, has_more, TASK_COLUMNS)
+                entries.append((key, render_body(payload)))
+                if not has_more:
+                    break
+                cursor = payload['next_cursor']
+                after = (tasks[-1]['created_at'], tasks[-1]['id'])
+            pages = len(entries)
+
+            tasks = models.get_recent_tasks(CACHE_WARMUP_TASKS) if CACHE_WARMUP_TASKS > 0 else []
+            # As geracoes das tasks so sao conhecidas depois da consulta, em
+            # um unico MGET; com uma escrita no meio elas ficam de fora
+            keys = cache.versioned_keys(
+                [(first_page, (TASKS_NAMESPACE,))] + [(task_key(task['id']), task_namespaces(task['id'])) for task in tasks]
+            )
+            if before is None or any(key is None for key in keys) or any(key is None for key, _ in entries):
+                raise RuntimeError('geracao do cache indisponivel')
+            if keys[0] != before:
+                logger.info("Tasks alteradas durante o aquecimento: apenas as paginas foram gravadas")
+                tasks = []
+            entries += [(key, render_body({'task': serialize_task(task)})) for key, task in zip(keys[1:], tasks)]
+
+            if entries:
+                cache.store_responses(entries)
+            _warmup.update(status='done', pages=pages, tasks=len(tasks),
+                           duration_ms=round((time.perf_counter() - start) * 1000, 1))
+            logger.info("Cache aquecido: %s paginas e %s tasks em %sms", pages, len(tasks), _warmup['duration_ms'])
+            return True
+        except Exception as e:
+            _warmup['status'] = 'failed'
+            logger.error("Erro no aquecimento do cache: %s", e)
+            return False
+
+def warm_cache_with_retry():
+    # Aquecimento da inicializacao. O /health fica pronto depois da primeira
+    # tentativa, com ou sem sucesso: sem o Redis as rotas ainda respondem
+    # pelo banco. Ate dar certo, repete com backoff em segundo plano
+    delay = 1
+    warmed = warm_cache()
+    _warmup['ready'] = True
+    while not warmed:
+        time.sleep(delay)
+        delay = min(delay * 2, 30)
+        warmed = warm_cache()
+
+def resync_tasks():
+    # Notificacoes emitidas enquanto o listener estava desconectado (ou um
+    # '*') se perdem: troca as geracoes de paginas e de todas as tasks e
+    # aquece de novo, sem descartar o restante do cache das outras replicas
+    cache.bump_generations([TASKS_NAMESPACE, TASK_ITEMS_NAMESPACE])
+    warm_cache()
+
+_background_lock = threading.Lock()
+_background_pid = None
+
+def start_background_tasks():
+    # Por processo: uma thread que aquece o cache e outra escutando o NOTIFY
+    # dos triggers de tasks, para que escritas feitas fora da API tambem
+    # invalidem o cache
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid != os.getpid():
+            threading.Thread(target=warm_cache_with_retry, name='cache-warmup', daemon=True).start()
+            if models.DB_NOTIFY_ENABLED:
+                threading.Thread(
+                    target=models.listen_task_changes, args=(apply_task_changes, resync_tasks),
+                    name='tasks-changes', daemon=True
+                ).start()
+            _background_pid = os.getpid()
+
+def cached_json_response(cache_key, load_payload, **ttls):
+    # O corpo e serializado uma vez, no miss, e guardado pronto com seu hash;
+    # um hit so concatena o campo source. Retorna None se load_payload() nao
+    # encontrou nada
+    body, etag, source = cache.cache_response(cache_key, lambda: render_body(load_payload()), **ttls)
+    if body is None:
         return None
-    
-    task_dict = dict(task)
-    
-    if 'created_at' in task_dict and task_dict['created_at']:
-        task_dict['created_at'] = task_dict['created_at'].isoformat()
-    if 'updated_at' in task_dict and task_dict['updated_at']:
-        task_dict['updated_at'] = task_dict['updated_at'].isoformat()
-    
-    return task_dict
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(response_body(body, source), mimetype='application/json')
+    # Fraco: o corpo traz o campo source, que muda entre banco e cache sem
+    # mudar o conteudo representado pelo hash
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = source
+    return response
 
 @app.before_request
 def log_request():
-    logger.info(f"{request.method} {request.path} - {request.remote_addr}")
+    g.request_start = time.perf_counter()
+    start_background_tasks()
+    logger.info("%s %s - %s", request.method, request.path, request.remote_addr)
+
+@app.after_request
+def record_request(response):
+    # Rotuladas pelo padrao da rota (/tasks/<int:task_id>), nao pelo caminho,
+    # para manter poucas series; em /tasks/export mede ate o inicio do stream
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUEST_DURATION.observe(time.perf_counter() - g.get('request_start', time.perf_counter()),
+                                     request.method, route, response.status_code)
+    return response
 
 @app.route('/', methods=['GET'])
 def home():
     return jsonify({
         'service': 'Tasks API',
         'version': '1.0',
-        'endpoints': {
-            'tasks': '/tasks',
-            'task_by_id': '/tasks/<id>',
-            'create_task': 'POST /tasks',
-            'update_task': 'PUT /tasks/<id>',
-            'delete_task': 'DELETE /tasks/<id>',
-            'health': '/health',
-            'cache_stats': '/cache/stats'
-        }
+        'endpoints': ENDPOINTS
     }), 200
 
 @app.route('/health', methods=['GET'])
 def health():
     try:
-        conn = models.get_db_connection()
-        conn.close()
+        with models.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
         db_status = 'healthy'
     except Exception as e:
-        logger.error(f"Database health check failed: {str(e)}")
+        logger.error("Database health check failed: %s", e)
         db_status = 'unhealthy'
     
     try:
@@ -61,74 +200,112 @@ def health():
         redis_client.ping()
         cache_status = 'healthy'
     except Exception as e:
-        logger.error(f"Cache health check failed: {str(e)}")
+        logger.error("Cache health check failed: %s", e)
         cache_status = 'unhealthy'
     
+    # 503 ate o fim da primeira tentativa de aquecimento do cache
     return jsonify({
-        'api': 'healthy',
+        'api': 'healthy' if _warmup['ready'] else 'starting',
         'database': db_status,
-        'cache': cache_status
-    }), 200
+        'database_pool': models.pool_stats(),
+        'cache': cache_status,
+        'cache_warmup': dict(_warmup)
+    }), 200 if _warmup['ready'] else 503
 
 @app.route('/tasks', methods=['GET'])
 def get_tasks():
     try:
-        cache_key = 'all_tasks'
-        
-        cached_data = cache.cache_get(cache_key)
-        if cached_data:
-            logger.info("Cache HIT - Retornando dados do Redis")
-            return jsonify({
-                'source': 'cache',
-                'count': len(cached_data),
-                'tasks': cached_data
-            }), 200
-        
-        logger.info("Cache MISS - Consultando banco de dados")
-        tasks = models.get_all_tasks()
-        tasks_list = [serialize_task(task) for task in tasks]
-        
-        cache.cache_set(cache_key, tasks_list, expiration=60)
-        
-        return jsonify({
-            'source': 'database',
-            'count': len(tasks_list),
-            'tasks': tasks_list
-        }), 200
-    
+        try:
+            limit, after, status, fields = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        cache_key = cache.versioned_key(
+            page_cache_key(status, fields, limit, request.args.get('cursor')), TASKS_NAMESPACE
+        )
+
+        def load_page():
+            logger.info("Cache MISS - Consultando banco de dados")
+            tasks, has_more = models.get_tasks_page(limit, after, status, fields)
+            return page_payload(tasks, has_more, fields)
+
+        response = cached_json_response(cache_key, load_page)
+        if response.headers['X-Cache'] != 'database':
+            logger.info("Cache HIT (%s) - Retornando pagina do Redis", response.headers['X-Cache'])
+        return response
+
     except Exception as e:
-        logger.error(f"Error in get_tasks: {str(e)}")
+        logger.error("Error in get_tasks: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/tasks/search', methods=['GET'])
+def search_tasks():
+    try:
+        try:
+            query, limit, after = parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # TTL curto: resultados de busca variam muito e sao pouco reutilizados
+        cache_key = cache.versioned_key(
+            search_cache_key(query, limit, request.args.get('cursor')), TASKS_NAMESPACE
+        )
+
+        def load_results():
+            logger.info("Cache MISS - Buscando '%s' no banco de dados", query)
+            tasks, has_more = models.search_tasks(query, limit, after)
+            return search_payload(query, tasks, has_more)
+
+        return cached_json_response(cache_key, load_results, soft_ttl=TASKS_SEARCH_CACHE_TTL,
+                                    hard_ttl=TASKS_SEARCH_CACHE_TTL * 2)
+
+    except Exception as e:
+        logger.error("Error in search_tasks: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/export', methods=['GET'])
+def export_tasks():
+    # Exportacao completa sem cache: cada lote do cursor no servidor e
+    # codificado e enviado antes do proximo ser lido
+    try:
+        export_format, status, fields = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def generate():
+        first = True
+        exported = 0
+        for rows in models.iter_tasks(fields, status):
+            yield encode_export(export_format, rows, fields, first)
+            first = False
+            exported += len(rows)
+        if first and export_format == 'csv':
+            yield encode_export(export_format, [], fields, first)
+        logger.info("Exportacao %s concluida: %s tasks", export_format, exported)
+
+    return Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename=tasks.{export_format}'
+    })
+
 @app.route('/tasks/<int:task_id>', methods=['GET'])
 def get_task(task_id):
     try:
-        cache_key = f'task_{task_id}'
-        
-        cached_data = cache.cache_get(cache_key)
-        if cached_data:
-            logger.info(f"Cache HIT - Task {task_id}")
-            return jsonify({
-                'source': 'cache',
-                'task': cached_data
-            }), 200
+        cache_key = task_cache_key(task_id)
         
-        logger.info(f"Cache MISS - Task {task_id}")
-        task = models.get_task_by_id(task_id)
-        
-        if not task:
+        def load_task():
+            logger.info("Cache MISS - Task %s", task_id)
+            task = models.get_task_by_id(task_id)
+            return {'task': serialize_task(task)} if task else None
+
+        response = cached_json_response(cache_key, load_task)
+        if response is None:
             return jsonify({'error': 'Task not found'}), 404
-        
-        task_dict = serialize_task(task)
-        cache.cache_set(cache_key, task_dict, expiration=60)
-        
-        return jsonify({
-            'source': 'database',
-            'task': task_dict
-        }), 200
+        if response.headers['X-Cache'] != 'database':
+            logger.info("Cache HIT (%s) - Task %s", response.headers['X-Cache'], task_id)
+        return response
     
     except Exception as e:
-        logger.error(f"Error in get_task: {str(e)}")
+        logger.error("Error in get_task: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/tasks', methods=['POST'])
@@ -139,15 +316,15 @@ def create_task():
         if not data or 'title' not in data:
             return jsonify({'error': 'Title is required'}), 400
         
-        task = models.create_task(
+        task, txid = models.create_task(
             title=data['title'],
             description=data.get('description', ''),
             status=data.get('status', 'pending')
         )
         
-        cache.cache_delete('all_tasks')
+        invalidate_tasks(txid=txid)
         
-        logger.info(f"Nova task criada: {task['id']}")
+        logger.info("Nova task criada: %s", task['id'])
         
         return jsonify({
             'message': 'Task created successfully',
@@ -155,7 +332,7 @@ def create_task():
         }), 201
     
     except Exception as e:
-        logger.error(f"Error in create_task: {str(e)}")
+        logger.error("Error in create_task: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/tasks/<int:task_id>', methods=['PUT'])
@@ -163,7 +340,7 @@ def update_task(task_id):
     try:
         data = request.get_json()
         
-        task = models.update_task(
+        task, txid = models.update_task(
             task_id,
             title=data.get('title'),
             description=data.get('description'),
@@ -173,10 +350,9 @@ def update_task(task_id):
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         
-        cache.cache_delete('all_tasks')
-        cache.cache_delete(f'task_{task_id}')
+        invalidate_tasks({task_id}, txid)
         
-        logger.info(f"Task atualizada: {task_id}")
+        logger.info("Task atualizada: %s", task_id)
         
         return jsonify({
             'message': 'Task updated successfully',
@@ -184,21 +360,20 @@ def update_task(task_id):
         }), 200
     
     except Exception as e:
-        logger.error(f"Error in update_task: {str(e)}")
+        logger.error("Error in update_task: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     try:
-        task = models.delete_task(task_id)
+        task, txid = models.delete_task(task_id)
         
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         
-        cache.cache_delete('all_tasks')
-        cache.cache_delete(f'task_{task_id}')
+        invalidate_tasks({task_id}, txid)
         
-        logger.info(f"Task deletada: {task_id}")
+        logger.info("Task deletada: %s", task_id)
         
         return jsonify({
             'message': 'Task deleted successfully',
@@ -206,7 +381,80 @@ def delete_task(task_id):
         }), 200
     
     except Exception as e:
-        logger.error(f"Error in delete_task: {str(e)}")
+        logger.error("Error in delete_task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/batch', methods=['POST'])
+def create_tasks_batch():
+    try:
+        try:
+            items = parse_batch(request.get_json(silent=True), ('title',))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks, txid = models.create_tasks(items)
+        invalidate_tasks(txid=txid)
+
+        logger.info("Lote de tasks criado: %s", len(tasks))
+
+        return jsonify({
+            'message': 'Tasks created successfully',
+            'count': len(tasks),
+            'tasks': [serialize_task(task) for task in tasks]
+        }), 201
+
+    except Exception as e:
+        logger.error("Error in create_tasks_batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/batch', methods=['PATCH'])
+def update_tasks_batch():
+    try:
+        try:
+            items = parse_batch(request.get_json(silent=True), ('id',))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks, txid = models.update_tasks(items)
+        updated = {task['id'] for task in tasks}
+        invalidate_tasks(updated, txid)
+
+        logger.info("Lote de tasks atualizado: %s", len(tasks))
+
+        return jsonify({
+            'message': 'Tasks updated successfully',
+            'count': len(tasks),
+            'tasks': [serialize_task(task) for task in tasks],
+            'not_found': sorted({item['id'] for item in items} - updated)
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in update_tasks_batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/batch', methods=['DELETE'])
+def delete_tasks_batch():
+    try:
+        try:
+            ids = parse_batch_ids(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks, txid = models.delete_tasks(ids)
+        deleted = {task['id'] for task in tasks}
+        invalidate_tasks(deleted, txid)
+
+        logger.info("Lote de tasks deletado: %s", len(tasks))
+
+        return jsonify({
+            'message': 'Tasks deleted successfully',
+            'count': len(tasks),
+            'tasks': [serialize_task(task) for task in tasks],
+            'not_found': sorted(ids - deleted)
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in delete_tasks_batch: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/cache/stats', methods=['GET'])
@@ -220,22 +468,33 @@ def cache_stats():
             'used_memory_human': info['used_memory_human'],
             'total_commands_processed': info['total_commands_processed'],
             'keyspace_hits': info.get('keyspace_hits', 0),
-            'keyspace_misses': info.get('keyspace_misses', 0)
+            'keyspace_misses': info.get('keyspace_misses', 0),
+            'local': cache.local_cache.stats(),
+            'stale_while_revalidate': cache.swr_stats(),
+            'codec': codec.codec_stats()
         }), 200
     except Exception as e:
-        logger.error(f"Error in cache_stats: {str(e)}")
+        logger.error("Error in cache_stats: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    snapshot = metrics.snapshot_metrics(models.pool_stats(), cache.local_cache.stats(), cache.swr_stats(),
+                                        codec.codec_stats())
+    return Response(metrics.render(snapshot), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/cache/clear', methods=['POST'])
 def clear_cache():
     try:
         cache.cache_clear()
+        cache.get_refresher().submit(warm_cache)
         logger.info("Cache limpo manualmente")
         return jsonify({'message': 'Cache cleared successfully'}), 200
     except Exception as e:
-        logger.error(f"Error in clear_cache: {str(e)}")
+        logger.error("Error in clear_cache: %s", e)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
     logger.info("Iniciando API na porta 5000")
+    start_background_tasks()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
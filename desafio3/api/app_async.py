@@ -0,0 +1,472 @@
+from quart import Quart, Response, g, jsonify, request
+import asyncio
+import logging
+import logs
+import codec
+import time
+import metrics
+import models_async as models
+import cache_async as cache
+import cache as cache_sync
+from contract import (
+    CACHE_WARMUP_PAGES, CACHE_WARMUP_TASKS, ENDPOINTS, EXPORT_FORMATS, TASK_COLUMNS, TASK_ITEMS_NAMESPACE,
+    TASKS_NAMESPACE, TASKS_PAGE_SIZE, TASKS_SEARCH_CACHE_TTL, changed_task_namespaces, encode_export,
+    page_cache_key, page_payload, parse_batch, parse_batch_ids, parse_export_args, parse_page_args,
+    parse_search_args, render_body, response_body, search_cache_key, search_payload, serialize_task, task_key,
+    task_namespaces
+)
+
+# Variante ASGI da API (Quart + asyncpg + redis.asyncio) com as mesmas rotas,
+# validacao e corpos de resposta de app.py. Executar com:
+#   hypercorn app_async:app --bind 0.0.0.0:5000
+
+app = Quart(__name__)
+
+logs.setup_logging('api-async')
+logger = logging.getLogger(__name__)
+
+_change_listener = None
+_warmup_task = None
+_warmup_lock = asyncio.Lock()
+_warmup = {'ready': False, 'status': 'pending', 'pages': 0, 'tasks': 0, 'duration_ms': None}
+
+@app.before_serving
+async def startup():
+    global _change_listener, _warmup_task
+    await models.init_pool()
+    _warmup_task = asyncio.get_running_loop().create_task(warm_cache_with_retry())
+    if models.DB_NOTIFY_ENABLED:
+        _change_listener = asyncio.get_running_loop().create_task(
+            models.listen_task_changes(apply_task_changes, resync_tasks)
+        )
+
+@app.after_serving
+async def shutdown():
+    for task in (_change_listener, _warmup_task):
+        if task is not None:
+            task.cancel()
+    await models.close_pool()
+    await cache.close()
+
+async def task_cache_key(task_id):
+    # Mesmo versionamento de app.task_cache_key
+    return await cache.versioned_key(task_key(task_id), *task_namespaces(task_id))
+
+async def invalidate_tasks(task_ids=(), txid=None):
+    await cache.bump_generations([TASKS_NAMESPACE] + changed_task_namespaces(task_ids),
+                                 claims=[txid] if txid is not None else ())
+
+async def apply_task_changes(notifications):
+    # Mesmo criterio de app.apply_task_changes
+    owned = await cache.claim_notifications([token for token, _ in notifications])
+    changes = [ids for token, ids in notifications if token in owned]
+    if not changes:
+        return
+    if None in changes:
+        await resync_tasks()
+    else:
+        await invalidate_tasks(set().union(*changes))
+
+async def warm_cache():
+    # Mesmo aquecimento de app.warm_cache
+    async with _warmup_lock:
+        _warmup['status'] = 'running'
+        start = time.perf_counter()
+        try:
+            entries = []
+            first_page = page_cache_key(None, TASK_COLUMNS, TASKS_PAGE_SIZE, None)
+            before = await cache.versioned_key(first_page, TASKS_NAMESPACE)
+            after = cursor = None
+            for _ in range(CACHE_WARMUP_PAGES):
+                key = await cache.versioned_key(
+                    page_cache_key(None, TASK_COLUMNS, TASKS_PAGE_SIZE, cursor), TASKS_NAMESPACE
+                )
+                tasks, has_more = await models.get_tasks_page(TASKS_PAGE_SIZE, after)
+                payload = page_payload(tasks, has_more, TASK_COLUMNS)
+                entries.append((key, render_body(payload)))
+                if not has_more:
+                    break
+                cursor = payload['next_cursor']
+                after = (tasks[-1]['created_at'], tasks[-1]['id'])
+            pages = len(entries)
+
+            tasks = await models.get_recent_tasks(CACHE_WARMUP_TASKS) if CACHE_WARMUP_TASKS > 0 else []
+            keys = await cache.versioned_keys(
+                [(first_page, (TASKS_NAMESPACE,))] + [(task_key(task['id']), task_namespaces(task['id'])) for task in tasks]
+            )
+            if before is None or any(key is None for key in keys) or any(key is None for key, _ in entries):
+                raise RuntimeError('geracao do cache indisponivel')
+            if keys[0] != before:
+                logger.info("Tasks alteradas durante o aquecimento: apenas as paginas foram gravadas")
+                tasks = []
+            entries += [(key, render_body({'task': serialize_task(task)})) for key, task in zip(keys[1:], tasks)]
+
+            if entries:
+                await cache.store_responses(entries)
+            _warmup.update(status='done', pages=pages, tasks=len(tasks),
+                           duration_ms=round((time.perf_counter() - start) * 1000, 1))
+            logger.info("Cache aquecido: %s paginas e %s tasks em %sms", pages, len(tasks), _warmup['duration_ms'])
+            return True
+        except Exception as e:
+            _warmup['status'] = 'failed'
+            logger.error("Erro no aquecimento do cache: %s", e)
+            return False
+
+async def warm_cache_with_retry():
+    # Mesmas tentativas de app.warm_cache_with_retry
+    delay = 1
+    warmed = await warm_cache()
+    _warmup['ready'] = True
+    while not warmed:
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30)
+        warmed = await warm_cache()
+
+async def resync_tasks():
+    # Mesma ressincronizacao de app.resync_tasks
+    await cache.bump_generations([TASKS_NAMESPACE, TASK_ITEMS_NAMESPACE])
+    await warm_cache()
+
+async def cached_json_response(cache_key, load_payload, **ttls):
+    async def render():
+        return render_body(await load_payload())
+
+    body, etag, source = await cache.cache_response(cache_key, render, **ttls)
+    if body is None:
+        return None
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response('', status=304)
+    else:
+        response = Response(response_body(body, source), mimetype='application/json')
+    # Fraco: o corpo traz o campo source, que muda entre banco e cache sem
+    # mudar o conteudo representado pelo hash
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = source
+    return response
+
+@app.before_request
+async def log_request():
+    g.request_start = time.perf_counter()
+    logger.info("%s %s - %s", request.method, request.path, request.remote_addr)
+
+@app.after_request
+async def record_request(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUEST_DURATION.observe(time.perf_counter() - g.get('request_start', time.perf_counter()),
+                                     request.method, route, response.status_code)
+    return response
+
+@app.route('/', methods=['GET'])
+async def home():
+    return jsonify({
+        'service': 'Tasks API',
+        'version': '1.0',
+        'runtime': 'asgi',
+        'endpoints': ENDPOINTS
+    }), 200
+
+@app.route('/health', methods=['GET'])
+async def health():
+    try:
+        async with models.get_connection() as conn:
+            await conn.execute('SELECT 1')
+        db_status = 'healthy'
+    except Exception as e:
+        logger.error("Database health check failed: %s", e)
+        db_status = 'unhealthy'
+
+    try:
+        await cache.get_redis_client().ping()
+        cache_status = 'healthy'
+    except Exception as e:
+        logger.error("Cache health check failed: %s", e)
+        cache_status = 'unhealthy'
+
+    return jsonify({
+        'api': 'healthy' if _warmup['ready'] else 'starting',
+        'database': db_status,
+        'database_pool': models.pool_stats(),
+        'cache': cache_status,
+        'cache_warmup': dict(_warmup)
+    }), 200 if _warmup['ready'] else 503
+
+@app.route('/tasks', methods=['GET'])
+async def get_tasks():
+    try:
+        try:
+            limit, after, status, fields = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        cache_key = await cache.versioned_key(
+            page_cache_key(status, fields, limit, request.args.get('cursor')), TASKS_NAMESPACE
+        )
+
+        async def load_page():
+            logger.info("Cache MISS - Consultando banco de dados")
+            tasks, has_more = await models.get_tasks_page(limit, after, status, fields)
+            return page_payload(tasks, has_more, fields)
+
+        response = await cached_json_response(cache_key, load_page)
+        if response.headers['X-Cache'] != 'database':
+            logger.info("Cache HIT (%s) - Retornando pagina do Redis", response.headers['X-Cache'])
+        return response
+
+    except Exception as e:
+        logger.error("Error in get_tasks: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/search', methods=['GET'])
+async def search_tasks():
+    try:
+        try:
+            query, limit, after = parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        cache_key = await cache.versioned_key(
+            search_cache_key(query, limit, request.args.get('cursor')), TASKS_NAMESPACE
+        )
+
+        async def load_results():
+            logger.info("Cache MISS - Buscando '%s' no banco de dados", query)
+            tasks, has_more = await models.search_tasks(query, limit, after)
+            return search_payload(query, tasks, has_more)
+
+        return await cached_json_response(cache_key, load_results, soft_ttl=TASKS_SEARCH_CACHE_TTL,
+                                          hard_ttl=TASKS_SEARCH_CACHE_TTL * 2)
+
+    except Exception as e:
+        logger.error("Error in search_tasks: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/export', methods=['GET'])
+async def export_tasks():
+    try:
+        export_format, status, fields = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    async def generate():
+        first = True
+        exported = 0
+        async for rows in models.iter_tasks(fields, status):
+            yield encode_export(export_format, rows, fields, first)
+            first = False
+            exported += len(rows)
+        if first and export_format == 'csv':
+            yield encode_export(export_format, [], fields, first)
+        logger.info("Exportacao %s concluida: %s tasks", export_format, exported)
+
+    response = Response(generate(), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=tasks.{export_format}'
+    response.timeout = None
+    return response
+
+@app.route('/tasks/<int:task_id>', methods=['GET'])
+async def get_task(task_id):
+    try:
+        cache_key = await task_cache_key(task_id)
+
+        async def load_task():
+            logger.info("Cache MISS - Task %s", task_id)
+            task = await models.get_task_by_id(task_id)
+            return {'task': serialize_task(task)} if task else None
+
+        response = await cached_json_response(cache_key, load_task)
+        if response is None:
+            return jsonify({'error': 'Task not found'}), 404
+        if response.headers['X-Cache'] != 'database':
+            logger.info("Cache HIT (%s) - Task %s", response.headers['X-Cache'], task_id)
+        return response
+
+    except Exception as e:
+        logger.error("Error in get_task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks', methods=['POST'])
+async def create_task():
+    try:
+        data = await request.get_json(silent=True)
+
+        if not data or 'title' not in data:
+            return jsonify({'error': 'Title is required'}), 400
+
+        task, txid = await models.create_task(
+            title=data['title'],
+            description=data.get('description', ''),
+            status=data.get('status', 'pending')
+        )
+
+        await invalidate_tasks(txid=txid)
+
+        logger.info("Nova task criada: %s", task['id'])
+
+        return jsonify({
+            'message': 'Task created successfully',
+            'task': serialize_task(task)
+        }), 201
+
+    except Exception as e:
+        logger.error("Error in create_task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/<int:task_id>', methods=['PUT'])
+async def update_task(task_id):
+    try:
+        data = await request.get_json(silent=True) or {}
+
+        task, txid = await models.update_task(
+            task_id,
+            title=data.get('title'),
+            description=data.get('description'),
+            status=data.get('status')
+        )
+
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+
+        await invalidate_tasks({task_id}, txid)
+
+        logger.info("Task atualizada: %s", task_id)
+
+        return jsonify({
+            'message': 'Task updated successfully',
+            'task': serialize_task(task)
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in update_task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/<int:task_id>', methods=['DELETE'])
+async def delete_task(task_id):
+    try:
+        task, txid = await models.delete_task(task_id)
+
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+
+        await invalidate_tasks({task_id}, txid)
+
+        logger.info("Task deletada: %s", task_id)
+
+        return jsonify({
+            'message': 'Task deleted successfully',
+            'task': serialize_task(task)
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in delete_task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/batch', methods=['POST'])
+async def create_tasks_batch():
+    try:
+        try:
+            items = parse_batch(await request.get_json(silent=True), ('title',))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks, txid = await models.create_tasks(items)
+        await invalidate_tasks(txid=txid)
+
+        logger.info("Lote de tasks criado: %s", len(tasks))
+
+        return jsonify({
+            'message': 'Tasks created successfully',
+            'count': len(tasks),
+            'tasks': [serialize_task(task) for task in tasks]
+        }), 201
+
+    except Exception as e:
+        logger.error("Error in create_tasks_batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/batch', methods=['PATCH'])
+async def update_tasks_batch():
+    try:
+        try:
+            items = parse_batch(await request.get_json(silent=True), ('id',))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks, txid = await models.update_tasks(items)
+        updated = {task['id'] for task in tasks}
+        await invalidate_tasks(updated, txid)
+
+        logger.info("Lote de tasks atualizado: %s", len(tasks))
+
+        return jsonify({
+            'message': 'Tasks updated successfully',
+            'count': len(tasks),
+            'tasks': [serialize_task(task) for task in tasks],
+            'not_found': sorted({item['id'] for item in items} - updated)
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in update_tasks_batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/tasks/batch', methods=['DELETE'])
+async def delete_tasks_batch():
+    try:
+        try:
+            ids = parse_batch_ids(await request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        tasks, txid = await models.delete_tasks(ids)
+        deleted = {task['id'] for task in tasks}
+        await invalidate_tasks(deleted, txid)
+
+        logger.info("Lote de tasks deletado: %s", len(tasks))
+
+        return jsonify({
+            'message': 'Tasks deleted successfully',
+            'count': len(tasks),
+            'tasks': [serialize_task(task) for task in tasks],
+            'not_found': sorted(ids - deleted)
+        }), 200
+
+    except Exception as e:
+        logger.error("Error in delete_tasks_batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/cache/stats', methods=['GET'])
+async def cache_stats():
+    try:
+        info = await cache.get_redis_client().info()
+
+        return jsonify({
+            'connected_clients': info['connected_clients'],
+            'used_memory_human': info['used_memory_human'],
+            'total_commands_processed': info['total_commands_processed'],
+            'keyspace_hits': info.get('keyspace_hits', 0),
+            'keyspace_misses': info.get('keyspace_misses', 0),
+            'local': cache_sync.local_cache.stats(),
+            'stale_while_revalidate': cache_sync.swr_stats(),
+            'codec': codec.codec_stats()
+        }), 200
+    except Exception as e:
+        logger.error("Error in cache_stats: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    snapshot = metrics.snapshot_metrics(models.pool_stats(), cache_sync.local_cache.stats(),
+                                        cache_sync.swr_stats(), codec.codec_stats())
+    return Response(metrics.render(snapshot), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/cache/clear', methods=['POST'])
+async def clear_cache():
+    try:
+        await cache.cache_clear()
+        cache.run_in_background(warm_cache())
+        logger.info("Cache limpo manualmente")
+        return jsonify({'message': 'Cache cleared successfully'}), 200
+    except Exception as e:
+        logger.error("Error in clear_cache: %s", e)
+        return jsonify({'error': str(e)}), 500
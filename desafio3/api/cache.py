@@ -1,67 +1,593 @@
 import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+import hashlib
+import heapq
 import json
 import os
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import codec
+import metrics
 
 logger = logging.getLogger(__name__)
 
+# Um unico pool por processo, compartilhado entre as threads da API. O PING
+# so e enviado pelo proprio redis-py quando uma conexao ficou ociosa por mais
+# de health_check_interval segundos; falhas de conexao/timeout sao repetidas
+# com backoff em uma conexao nova. As respostas chegam como bytes: os valores
+# em cache sao binarios (codec.py)
 REDIS_CONFIG = {
     'host': os.getenv('REDIS_HOST', 'cache-redis'),
     'port': int(os.getenv('REDIS_PORT', 6379)),
     'db': 0,
-    'decode_responses': True
+    'decode_responses': False,
+    'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+    'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', 2)),
+    'socket_connect_timeout': float(os.getenv('REDIS_CONNECT_TIMEOUT', 2)),
+    'socket_keepalive': True,
+    'health_check_interval': int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+    'retry': Retry(ExponentialBackoff(cap=0.5, base=0.01), int(os.getenv('REDIS_RETRIES', 2))),
+    'retry_on_error': [redis.exceptions.ConnectionError, redis.exceptions.TimeoutError]
 }
 
+class TimedRedis(redis.Redis):
+    # Mede o tempo de ida e volta de cada comando (um pipeline conta como um
+    # comando MULTI/PIPELINE). O pub/sub usa outro caminho e fica de fora
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        except Exception:
+            metrics.REDIS_ERRORS.inc(str(args[0]).upper())
+            raise
+        finally:
+            metrics.REDIS_DURATION.observe(time.perf_counter() - start, str(args[0]).upper())
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class TimedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        command = 'MULTI' if self.transaction else 'PIPELINE'
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except Exception:
+            metrics.REDIS_ERRORS.inc(command)
+            raise
+        finally:
+            metrics.REDIS_DURATION.observe(time.perf_counter() - start, command)
+
+_pool = redis.ConnectionPool(**REDIS_CONFIG)
+_client = TimedRedis(connection_pool=_pool)
+
+LOCAL_CACHE_SIZE = int(os.getenv('LOCAL_CACHE_SIZE', 1000))
+LOCAL_CACHE_TTL = float(os.getenv('LOCAL_CACHE_TTL', 5))
+INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache:invalidate')
+
+# Chaves versionadas: cada namespace tem um contador de geracao no Redis
+# (gen:<namespace>, sem TTL) que entra no nome das chaves derivadas. Invalidar
+# o namespace e um INCR; as entradas antigas deixam de ser lidas e expiram
+# pelo TTL. O namespace global entra em todas as chaves e substitui o FLUSHDB
+GENERATION_PREFIX = 'gen:'
+GLOBAL_NAMESPACE = 'all'
+# Notificacoes do banco ja tratadas por algum processo (ver claim_notifications)
+NOTIFY_CLAIM_PREFIX = 'notify:'
+NOTIFY_CLAIM_TTL = 300
+# Quantos tokens ganhos cada processo lembra: as notificacoes de uma mesma
+# transacao podem chegar em lotes diferentes do listener
+NOTIFY_CLAIM_MEMORY = 1024
+
+CACHE_SOFT_TTL = int(os.getenv('CACHE_SOFT_TTL', 60))
+CACHE_HARD_TTL = int(os.getenv('CACHE_HARD_TTL', 300))
+CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', 10))
+CACHE_LOCK_WAIT = float(os.getenv('CACHE_LOCK_WAIT', 1))
+CACHE_LOCK_POLL = 0.05
+CACHE_REFRESH_WORKERS = int(os.getenv('CACHE_REFRESH_WORKERS', 4))
+# Chaves quentes: a cada CACHE_HOT_INTERVAL segundos, as CACHE_HOT_KEYS chaves
+# mais lidas na janela (com pelo menos CACHE_HOT_MIN_HITS leituras) sao
+# recalculadas antes de deixarem de ser frescas
+CACHE_HOT_KEYS = int(os.getenv('CACHE_HOT_KEYS', 50))
+CACHE_HOT_MIN_HITS = int(os.getenv('CACHE_HOT_MIN_HITS', 5))
+CACHE_HOT_INTERVAL = float(os.getenv('CACHE_HOT_INTERVAL', 10))
+CACHE_HOT_TRACKED = int(os.getenv('CACHE_HOT_TRACKED', 10000))
+
 def get_redis_client():
+    return _client
+
+class LocalCache:
+    # Primeiro nivel do cache, dentro do processo: LRU limitado em numero de
+    # entradas, com TTL proprio (nunca maior que o do Redis). Os valores ja
+    # estao desserializados e devem ser tratados como somente leitura
+    def __init__(self, max_size=LOCAL_CACHE_SIZE, ttl=LOCAL_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Incrementado a cada invalidacao: um valor lido do Redis antes de uma
+        # invalidacao nao pode ser gravado aqui depois dela
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, expiration, epoch=None):
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + min(expiration, self.ttl)
+        with self.lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete_many(self, keys):
+        with self.lock:
+            self.epoch += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.epoch += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+local_cache = LocalCache()
+_listener_lock = threading.Lock()
+_listener_pid = None
+
+def apply_invalidation(message):
+    op = message.get('op')
+    if op == 'keys':
+        local_cache.delete_many(message['key'])
+    else:
+        local_cache.clear()
+
+def listen_invalidations():
+    # Cada replica da API (e cada processo) assina o canal e descarta sua
+    # copia local. Mensagens perdidas durante uma queda do Redis nao tem como
+    # ser recuperadas, entao a reconexao limpa todo o nivel local
+    while True:
+        pubsub = None
+        try:
+            pubsub = _client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            local_cache.clear()
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message['type'] == 'message':
+                    apply_invalidation(json.loads(message['data']))
+        except Exception as e:
+            logger.error("Erro no listener de invalidacao do cache: %s", e)
+            local_cache.clear()
+            time.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+def start_invalidation_listener():
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid != os.getpid():
+            threading.Thread(target=listen_invalidations, name='cache-invalidation', daemon=True).start()
+            _listener_pid = os.getpid()
+
+def publish_invalidation(client, op, key=None):
+    client.publish(INVALIDATION_CHANNEL, json.dumps({'op': op, 'key': key}))
+
+def get_generations(namespaces):
+    # As geracoes ficam no nivel local como qualquer outra chave e sao
+    # descartadas pela mesma mensagem de invalidacao que acompanha o INCR
+    keys = [GENERATION_PREFIX + namespace for namespace in namespaces]
+    epoch = local_cache.epoch
+    generations = [local_cache.get(key) for key in keys]
+    missing = [index for index, generation in enumerate(generations) if generation is None]
+    if missing:
+        values = get_redis_client().mget([keys[index] for index in missing])
+        for index, value in zip(missing, values):
+            generations[index] = int(value or 0)
+            local_cache.set(keys[index], generations[index], LOCAL_CACHE_TTL, epoch)
+    return generations
+
+def versioned_key(key, *namespaces):
+    # Sem as geracoes nao ha como montar uma chave valida: None faz o
+    # chamador ir direto ao banco em vez de ler uma versao antiga
     try:
-        client = redis.Redis(**REDIS_CONFIG)
-        client.ping()
-        return client
+        generations = get_generations((GLOBAL_NAMESPACE,) + namespaces)
     except Exception as e:
-        logger.error(f"Erro ao conectar ao Redis: {str(e)}")
-        raise
+        logger.error("Erro ao ler geracao do cache: %s", e)
+        metrics.record_lookup(key, 'error')
+        return None
+    return f"{key}@{'.'.join(str(generation) for generation in generations)}"
 
-def cache_get(key):
+def versioned_keys(items):
+    # versioned_key para varias chaves (pares (chave, namespaces)) com um
+    # unico MGET das geracoes que faltam no nivel local
+    namespaces = list(dict.fromkeys(
+        [GLOBAL_NAMESPACE] + [namespace for _, key_namespaces in items for namespace in key_namespaces]
+    ))
     try:
-        client = get_redis_client()
-        value = client.get(key)
-        if value:
-            logger.info(f"Cache GET - Key: {key} - FOUND")
-            return json.loads(value)
-        else:
-            logger.info(f"Cache GET - Key: {key} - NOT FOUND")
-            return None
+        generations = dict(zip(namespaces, get_generations(namespaces)))
     except Exception as e:
-        logger.error(f"Erro ao ler cache: {str(e)}")
-        return None
+        logger.error("Erro ao ler geracao do cache: %s", e)
+        return [None] * len(items)
+    return [
+        f"{key}@{'.'.join(str(generations[namespace]) for namespace in (GLOBAL_NAMESPACE,) + tuple(key_namespaces))}"
+        for key, key_namespaces in items
+    ]
 
-def cache_set(key, value, expiration=300):
+def bump_generations(namespaces, delete_keys=(), claims=()):
+    # Um unico MULTI com os INCR, o UNLINK de chaves avulsas e o PUBLISH
+    # da invalidacao, independente de quantas chaves derivadas existem.
+    # claims registra as notificacoes do banco ja cobertas por esta
+    # invalidacao, para que nenhum listener a repita
+    keys = [GENERATION_PREFIX + namespace for namespace in dict.fromkeys(namespaces)]
+    delete_keys = [key for key in delete_keys if key]
     try:
-        client = get_redis_client()
-        serialized = json.dumps(value, default=str)
-        result = client.setex(key, expiration, serialized)
-        logger.info(f"Cache SET - Key: {key} - Expiration: {expiration}s - Success: {result}")
-        return result
+        local_cache.delete_many(keys + delete_keys)
+        pipe = get_redis_client().pipeline(transaction=True)
+        for key in keys:
+            pipe.incr(key)
+        if delete_keys:
+            pipe.unlink(*delete_keys)
+        for token in claims:
+            pipe.set(NOTIFY_CLAIM_PREFIX + str(token), 1, nx=True, ex=NOTIFY_CLAIM_TTL)
+        publish_invalidation(pipe, 'keys', keys + delete_keys)
+        result = pipe.execute()
+        logger.info("Cache BUMP - Namespaces: %s - Generations: %s - Deleted: %s",
+                    ', '.join(namespaces), result[:len(keys)], len(delete_keys))
+        return result[:len(keys)]
     except Exception as e:
-        logger.error(f"Erro ao gravar cache: {str(e)}")
+        logger.error("Erro ao invalidar geracao do cache: %s", e)
         return False
 
-def cache_delete(key):
+_claimed_lock = threading.Lock()
+_claimed_tokens = OrderedDict()
+
+def pending_claims(tokens):
+    # Tokens que ainda precisam de SET NX: os que este processo ja ganhou
+    # continuam seus sem nova ida ao Redis
+    with _claimed_lock:
+        return [token for token in dict.fromkeys(tokens) if token is not None and token not in _claimed_tokens]
+
+def owned_claims(tokens, claims, results):
+    # Registra os tokens ganhos agora e devolve todos os de tokens que sao
+    # deste processo. None (payload sem txid) e sempre de quem o recebe
+    with _claimed_lock:
+        for token, won in zip(claims, results):
+            if won:
+                _claimed_tokens[token] = True
+                if len(_claimed_tokens) > NOTIFY_CLAIM_MEMORY:
+                    _claimed_tokens.popitem(last=False)
+        return {token for token in tokens if token is None or token in _claimed_tokens}
+
+def claim_notifications(tokens):
+    # Todos os processos de todas as replicas recebem cada NOTIFY, mas so o
+    # primeiro a gravar o token (SET NX) invalida o Redis; os demais recebem
+    # a invalidacao do nivel local pelo pub/sub. A rota que fez a escrita
+    # grava o token junto com a propria invalidacao (bump_generations), e
+    # nesse caso nenhum listener a repete. Retorna os tokens deste processo;
+    # com erro no Redis todos contam como ganhos: invalidar de novo e inofensivo
+    claims = pending_claims(tokens)
     try:
-        client = get_redis_client()
-        result = client.delete(key)
-        logger.info(f"Cache DELETE - Key: {key} - Deleted: {result}")
-        return result
+        results = []
+        if claims:
+            pipe = get_redis_client().pipeline(transaction=False)
+            for token in claims:
+                pipe.set(NOTIFY_CLAIM_PREFIX + token, 1, nx=True, ex=NOTIFY_CLAIM_TTL)
+            results = pipe.execute()
     except Exception as e:
-        logger.error(f"Erro ao deletar cache: {str(e)}")
-        return False
+        logger.error("Erro ao registrar notificacao de tasks: %s", e)
+        return set(tokens)
+    return owned_claims(tokens, claims, results)
 
 def cache_clear():
+    # Troca a geracao global em vez de FLUSHDB: nenhuma pausa no Redis e as
+    # chaves de outros usos do banco 0 nao sao apagadas
+    result = bump_generations([GLOBAL_NAMESPACE])
+    if result is not False:
+        logger.info("Cache CLEAR - Geracao global: %s", result[0])
+    return result
+
+_refresh_lock = threading.Lock()
+_refresher = None
+_refresher_pid = None
+_swr_lock = threading.Lock()
+_swr_stats = {
+    'fresh_hits': 0,
+    'stale_hits': 0,
+    'recomputes': 0,
+    'background_refreshes': 0,
+    'refresh_errors': 0,
+    'lock_waits': 0,
+    'lock_wait_timeouts': 0,
+    'hot_refreshes': 0
+}
+
+def _count(name):
+    with _swr_lock:
+        _swr_stats[name] += 1
+
+def swr_stats():
+    with _swr_lock:
+        return dict(_swr_stats)
+
+def get_refresher():
+    # Executor criado por processo (como o listener): threads nao sobrevivem
+    # a um fork
+    global _refresher, _refresher_pid
+    if _refresher_pid != os.getpid():
+        with _refresh_lock:
+            if _refresher_pid != os.getpid():
+                _refresher = ThreadPoolExecutor(max_workers=CACHE_REFRESH_WORKERS,
+                                                thread_name_prefix='cache-refresh')
+                _refresher_pid = os.getpid()
+    return _refresher
+
+def acquire_rebuild_lock(key):
+    # Lease no Redis com token: so quem o obteve recalcula a chave. O timeout
+    # libera a lease se o processo morrer no meio do recalculo
+    lock = get_redis_client().lock(f'lock:{key}', timeout=CACHE_LOCK_TIMEOUT,
+                                   blocking=False, thread_local=False)
+    return lock if lock.acquire() else None
+
+def release_rebuild_lock(lock):
     try:
-        client = get_redis_client()
-        result = client.flushdb()
-        logger.info(f"Cache CLEAR - All keys deleted")
+        lock.release()
+    except Exception as e:
+        logger.warning("Lease de recalculo expirou antes da liberacao: %s", e)
+
+def encode_envelope(value, fresh_until):
+    # "<fresh_until>|<valor codificado>": o valor (str) vai sem passar pelo
+    # JSON, na ida e na volta; o cabecalho do codec vem logo apos o |
+    return f"{fresh_until:.3f}|".encode() + codec.encode(value)
+
+def decode_envelope(data):
+    fresh_until, _, payload = data.partition(b'|')
+    if payload[:2] == b'r|':
+        # Formato anterior "<fresh_until>|r|<texto>", que continua no Redis
+        # ate o hard TTL: sem o segundo | ele e o mesmo valor sem compressao
+        payload = payload[:1] + payload[2:]
+    return float(fresh_until), codec.decode(payload)
+
+def get_envelope(key):
+    # Consulta o nivel local e depois o Redis; o nivel local guarda a tupla
+    # (fresh_until, valor) ja decodificada
+    start_invalidation_listener()
+    envelope = local_cache.get(key)
+    if envelope is not None:
+        logger.info("Cache GET - Key: %s - FOUND (local)", key)
+        return envelope
+
+    epoch = local_cache.epoch
+    data = get_redis_client().get(key)
+    if not data:
+        logger.info("Cache GET - Key: %s - NOT FOUND", key)
+        return None
+    logger.info("Cache GET - Key: %s - FOUND", key)
+    envelope = decode_envelope(data)
+    local_cache.set(key, envelope, LOCAL_CACHE_TTL, epoch)
+    return envelope
+
+def store_envelope(key, value, soft_ttl, hard_ttl):
+    # O valor fica no Redis ate o hard TTL; depois do soft TTL ele ainda e
+    # servido, mas dispara um recalculo em segundo plano
+    try:
+        fresh_until = time.time() + soft_ttl
+        result = get_redis_client().setex(key, hard_ttl, encode_envelope(value, fresh_until))
+        local_cache.set(key, (fresh_until, value), hard_ttl)
+        logger.info("Cache SET - Key: %s - Expiration: %ss - Success: %s", key, hard_ttl, result)
         return result
     except Exception as e:
-        logger.error(f"Erro ao limpar cache: {str(e)}")
-        return False
\ No newline at end of file
+        logger.error("Erro ao gravar cache: %s", e)
+        return False
+
+def refresh_in_background(key, loader, soft_ttl, hard_ttl, lock):
+    try:
+        value = loader()
+        if value is not None:
+            store_envelope(key, value, soft_ttl, hard_ttl)
+        _count('background_refreshes')
+        logger.info("Cache REFRESH - Key: %s", key)
+    except Exception as e:
+        _count('refresh_errors')
+        logger.error("Erro ao recalcular cache em segundo plano: %s", e)
+    finally:
+        release_rebuild_lock(lock)
+
+class HotKeys:
+    # Conta as leituras por chave na janela atual, junto com o que e preciso
+    # para recalcular a chave (loader, TTLs). take() devolve as mais
+    # lidas e recomeca a janela: uma chave que deixou de ser lida (inclusive
+    # por ter mudado de geracao) sai da lista na janela seguinte
+    def __init__(self, size=CACHE_HOT_KEYS, min_hits=CACHE_HOT_MIN_HITS, max_tracked=CACHE_HOT_TRACKED):
+        self.size = size
+        self.min_hits = min_hits
+        self.max_tracked = max_tracked
+        self.counts = {}
+        self.specs = {}
+        self.lock = threading.Lock()
+
+    def record(self, key, spec):
+        if self.size <= 0:
+            return
+        with self.lock:
+            count = self.counts.get(key)
+            if count is None:
+                if len(self.counts) >= self.max_tracked:
+                    return
+                count = 0
+            self.counts[key] = count + 1
+            self.specs[key] = spec
+
+    def take(self):
+        with self.lock:
+            counts, specs = self.counts, self.specs
+            self.counts, self.specs = {}, {}
+        hottest = heapq.nlargest(self.size, counts.items(), key=lambda item: item[1])
+        return [(key, specs[key]) for key, count in hottest if count >= self.min_hits]
+
+hot_keys = HotKeys()
+_hot_lock = threading.Lock()
+_hot_pid = None
+
+def refresh_hot_keys():
+    # Recalcula em segundo plano as chaves quentes que deixariam de ser
+    # frescas antes da proxima passada, com a mesma lease do recalculo do
+    # stale-while-revalidate; chaves ja removidas ficam para a proxima leitura
+    while True:
+        time.sleep(CACHE_HOT_INTERVAL)
+        try:
+            for key, (loader, soft_ttl, hard_ttl) in hot_keys.take():
+                envelope = get_envelope(key)
+                if envelope is None or envelope[0] - time.time() > CACHE_HOT_INTERVAL:
+                    continue
+                lock = acquire_rebuild_lock(key)
+                if lock is not None:
+                    _count('hot_refreshes')
+                    get_refresher().submit(refresh_in_background, key, loader, soft_ttl, hard_ttl, lock)
+        except Exception as e:
+            logger.error("Erro ao recalcular chaves quentes do cache: %s", e)
+
+def start_hot_key_refresher():
+    global _hot_pid
+    if _hot_pid == os.getpid() or CACHE_HOT_KEYS <= 0:
+        return
+    with _hot_lock:
+        if _hot_pid != os.getpid():
+            threading.Thread(target=refresh_hot_keys, name='cache-hot-keys', daemon=True).start()
+            _hot_pid = os.getpid()
+
+def cache_get_or_compute(key, loader, soft_ttl=CACHE_SOFT_TTL, hard_ttl=CACHE_HARD_TTL):
+    # Cache-aside com recalculo unico (single-flight): apenas o dono da lease
+    # executa loader(); os demais recebem o valor vencido ou aguardam ate
+    # CACHE_LOCK_WAIT segundos pelo novo. Retorna (valor, origem), com origem
+    # 'cache', 'stale' ou 'database'. Resultados None nao sao guardados, e
+    # key None (geracao indisponivel) vai direto ao loader. O loader devolve
+    # str, guardada e devolvida sem serializacao
+    if key is None:
+        return loader(), 'database'
+
+    start_hot_key_refresher()
+    hot_keys.record(key, (loader, soft_ttl, hard_ttl))
+    lookup = 'miss'
+    try:
+        envelope = get_envelope(key)
+    except Exception as e:
+        logger.error("Erro ao ler cache: %s", e)
+        envelope = None
+        lookup = 'error'
+    if envelope is not None:
+        fresh_until, value = envelope
+        if fresh_until > time.time():
+            _count('fresh_hits')
+            metrics.record_lookup(key, 'hit')
+            return value, 'cache'
+        _count('stale_hits')
+        metrics.record_lookup(key, 'stale')
+        try:
+            lock = acquire_rebuild_lock(key)
+            if lock is not None:
+                get_refresher().submit(refresh_in_background, key, loader, soft_ttl, hard_ttl, lock)
+        except Exception as e:
+            logger.error("Erro ao agendar recalculo do cache: %s", e)
+        return value, 'stale'
+
+    lock = None
+    try:
+        lock = acquire_rebuild_lock(key)
+        if lock is None:
+            _count('lock_waits')
+            deadline = time.monotonic() + CACHE_LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(CACHE_LOCK_POLL)
+                envelope = get_envelope(key)
+                if envelope is not None:
+                    metrics.record_lookup(key, 'hit')
+                    return envelope[1], 'cache'
+            # O dono da lease demorou demais: calcula sem ela em vez de
+            # segurar a requisicao
+            _count('lock_wait_timeouts')
+    except Exception as e:
+        logger.error("Erro na lease de recalculo do cache: %s", e)
+
+    metrics.record_lookup(key, lookup)
+    try:
+        _count('recomputes')
+        value = loader()
+        if value is not None:
+            store_envelope(key, value, soft_ttl, hard_ttl)
+        return value, 'database'
+    finally:
+        if lock is not None:
+            release_rebuild_lock(lock)
+
+def cache_response(key, render, soft_ttl=CACHE_SOFT_TTL, hard_ttl=CACHE_HARD_TTL):
+    # Cacheia o corpo final da resposta: render() devolve o JSON ja
+    # serializado (ou None), guardado junto com o hash que vira o ETag.
+    # Retorna (corpo, etag, origem); um hit nao faz nenhum trabalho de JSON
+    def load():
+        body = render()
+        return response_value(body) if body is not None else None
+
+    value, source = cache_get_or_compute(key, load, soft_ttl, hard_ttl)
+    if value is None:
+        return None, None, source
+    etag, _, body = value.partition('\n')
+    return body, etag, source
+
+def response_value(body):
+    # Valor guardado por cache_response: "<sha1 do corpo>\n<corpo>"
+    return f"{hashlib.sha1(body.encode()).hexdigest()}\n{body}"
+
+def store_responses(entries, soft_ttl=CACHE_SOFT_TTL, hard_ttl=CACHE_HARD_TTL):
+    # Grava varios corpos (chave, corpo) no formato de cache_response com um
+    # unico pipeline, sem lease: usado no aquecimento do cache
+    fresh_until = time.time() + soft_ttl
+    values = [(key, response_value(body)) for key, body in entries]
+    pipe = get_redis_client().pipeline(transaction=False)
+    for key, value in values:
+        pipe.setex(key, hard_ttl, encode_envelope(value, fresh_until))
+    pipe.execute()
+    for key, value in values:
+        local_cache.set(key, (fresh_until, value), hard_ttl)
+    logger.info("Cache SET - %s chaves em pipeline - Expiration: %ss", len(values), hard_ttl)
+    return len(values)
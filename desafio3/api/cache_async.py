@@ -0,0 +1,345 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+import cache
+import metrics
+from cache import (
+    CACHE_HARD_TTL, CACHE_HOT_INTERVAL, CACHE_HOT_KEYS, CACHE_LOCK_POLL, CACHE_LOCK_TIMEOUT, CACHE_LOCK_WAIT,
+    CACHE_SOFT_TTL, GENERATION_PREFIX, GLOBAL_NAMESPACE, INVALIDATION_CHANNEL, LOCAL_CACHE_TTL, NOTIFY_CLAIM_PREFIX,
+    NOTIFY_CLAIM_TTL, decode_envelope, encode_envelope, local_cache, owned_claims, pending_claims, response_value
+)
+
+logger = logging.getLogger(__name__)
+
+# Versao assincrona de cache.py para app_async.py: mesmo formato de chaves,
+# envelopes, geracoes e canal de invalidacao, entao as duas APIs podem
+# dividir o mesmo Redis. O nivel local e as estatisticas sao os de cache.py;
+# o recalculo em segundo plano e o listener sao tarefas do event loop
+
+REDIS_CONFIG = dict(
+    cache.REDIS_CONFIG,
+    retry=Retry(ExponentialBackoff(cap=0.5, base=0.01), int(os.getenv('REDIS_RETRIES', 2))),
+    retry_on_error=[ConnectionError, TimeoutError]
+)
+
+class TimedRedis(redis.Redis):
+    # Mesma medicao de cache.TimedRedis, nos mesmos histogramas
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            metrics.REDIS_ERRORS.inc(str(args[0]).upper())
+            raise
+        finally:
+            metrics.REDIS_DURATION.observe(time.perf_counter() - start, str(args[0]).upper())
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class TimedPipeline(redis.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        command = 'MULTI' if self.is_transaction else 'PIPELINE'
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            metrics.REDIS_ERRORS.inc(command)
+            raise
+        finally:
+            metrics.REDIS_DURATION.observe(time.perf_counter() - start, command)
+
+_pool = redis.ConnectionPool(**REDIS_CONFIG)
+_client = TimedRedis(connection_pool=_pool)
+_listener = None
+_hot_refresher = None
+# Mesmo rastreador de cache.py; os loaders guardados aqui sao corrotinas
+hot_keys = cache.HotKeys()
+# Referencias fortes para as tarefas em segundo plano (o event loop so
+# guarda referencias fracas)
+_refreshes = set()
+
+def get_redis_client():
+    return _client
+
+async def close():
+    if _listener is not None:
+        _listener.cancel()
+    if _hot_refresher is not None:
+        _hot_refresher.cancel()
+    await _pool.disconnect()
+
+async def listen_invalidations():
+    while True:
+        pubsub = None
+        try:
+            pubsub = _client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            local_cache.clear()
+            while True:
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message['type'] == 'message':
+                    cache.apply_invalidation(json.loads(message['data']))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Erro no listener de invalidacao do cache: %s", e)
+            local_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+def start_invalidation_listener():
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.get_running_loop().create_task(listen_invalidations())
+
+async def get_generations(namespaces):
+    keys = [GENERATION_PREFIX + namespace for namespace in namespaces]
+    epoch = local_cache.epoch
+    generations = [local_cache.get(key) for key in keys]
+    missing = [index for index, generation in enumerate(generations) if generation is None]
+    if missing:
+        values = await _client.mget([keys[index] for index in missing])
+        for index, value in zip(missing, values):
+            generations[index] = int(value or 0)
+            local_cache.set(keys[index], generations[index], LOCAL_CACHE_TTL, epoch)
+    return generations
+
+async def versioned_key(key, *namespaces):
+    try:
+        generations = await get_generations((GLOBAL_NAMESPACE,) + namespaces)
+    except Exception as e:
+        logger.error("Erro ao ler geracao do cache: %s", e)
+        metrics.record_lookup(key, 'error')
+        return None
+    return f"{key}@{'.'.join(str(generation) for generation in generations)}"
+
+async def versioned_keys(items):
+    namespaces = list(dict.fromkeys(
+        [GLOBAL_NAMESPACE] + [namespace for _, key_namespaces in items for namespace in key_namespaces]
+    ))
+    try:
+        generations = dict(zip(namespaces, await get_generations(namespaces)))
+    except Exception as e:
+        logger.error("Erro ao ler geracao do cache: %s", e)
+        return [None] * len(items)
+    return [
+        f"{key}@{'.'.join(str(generations[namespace]) for namespace in (GLOBAL_NAMESPACE,) + tuple(key_namespaces))}"
+        for key, key_namespaces in items
+    ]
+
+async def bump_generations(namespaces, delete_keys=(), claims=()):
+    keys = [GENERATION_PREFIX + namespace for namespace in dict.fromkeys(namespaces)]
+    delete_keys = [key for key in delete_keys if key]
+    try:
+        local_cache.delete_many(keys + delete_keys)
+        async with _client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.incr(key)
+            if delete_keys:
+                pipe.unlink(*delete_keys)
+            for token in claims:
+                pipe.set(NOTIFY_CLAIM_PREFIX + str(token), 1, nx=True, ex=NOTIFY_CLAIM_TTL)
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps({'op': 'keys', 'key': keys + delete_keys}))
+            result = await pipe.execute()
+        logger.info("Cache BUMP - Namespaces: %s - Generations: %s - Deleted: %s",
+                    ', '.join(namespaces), result[:len(keys)], len(delete_keys))
+        return result[:len(keys)]
+    except Exception as e:
+        logger.error("Erro ao invalidar geracao do cache: %s", e)
+        return False
+
+async def claim_notifications(tokens):
+    # Mesmo criterio de cache.claim_notifications, com a mesma memoria dos
+    # tokens ganhos pelo processo
+    claims = pending_claims(tokens)
+    try:
+        results = []
+        if claims:
+            async with _client.pipeline(transaction=False) as pipe:
+                for token in claims:
+                    pipe.set(NOTIFY_CLAIM_PREFIX + token, 1, nx=True, ex=NOTIFY_CLAIM_TTL)
+                results = await pipe.execute()
+    except Exception as e:
+        logger.error("Erro ao registrar notificacao de tasks: %s", e)
+        return set(tokens)
+    return owned_claims(tokens, claims, results)
+
+async def cache_clear():
+    result = await bump_generations([GLOBAL_NAMESPACE])
+    if result is not False:
+        logger.info("Cache CLEAR - Geracao global: %s", result[0])
+    return result
+
+async def get_envelope(key):
+    start_invalidation_listener()
+    envelope = local_cache.get(key)
+    if envelope is not None:
+        logger.info("Cache GET - Key: %s - FOUND (local)", key)
+        return envelope
+
+    epoch = local_cache.epoch
+    data = await _client.get(key)
+    if not data:
+        logger.info("Cache GET - Key: %s - NOT FOUND", key)
+        return None
+    logger.info("Cache GET - Key: %s - FOUND", key)
+    envelope = decode_envelope(data)
+    local_cache.set(key, envelope, LOCAL_CACHE_TTL, epoch)
+    return envelope
+
+async def store_envelope(key, value, soft_ttl, hard_ttl):
+    try:
+        fresh_until = time.time() + soft_ttl
+        result = await _client.setex(key, hard_ttl, encode_envelope(value, fresh_until))
+        local_cache.set(key, (fresh_until, value), hard_ttl)
+        logger.info("Cache SET - Key: %s - Expiration: %ss - Success: %s", key, hard_ttl, result)
+        return result
+    except Exception as e:
+        logger.error("Erro ao gravar cache: %s", e)
+        return False
+
+async def acquire_rebuild_lock(key):
+    lock = _client.lock(f'lock:{key}', timeout=CACHE_LOCK_TIMEOUT, blocking=False, thread_local=False)
+    return lock if await lock.acquire() else None
+
+async def release_rebuild_lock(lock):
+    try:
+        await lock.release()
+    except Exception as e:
+        logger.warning("Lease de recalculo expirou antes da liberacao: %s", e)
+
+async def refresh_in_background(key, loader, soft_ttl, hard_ttl, lock):
+    try:
+        value = await loader()
+        if value is not None:
+            await store_envelope(key, value, soft_ttl, hard_ttl)
+        cache._count('background_refreshes')
+        logger.info("Cache REFRESH - Key: %s", key)
+    except Exception as e:
+        cache._count('refresh_errors')
+        logger.error("Erro ao recalcular cache em segundo plano: %s", e)
+    finally:
+        await release_rebuild_lock(lock)
+
+async def refresh_hot_keys():
+    # Equivalente a cache.refresh_hot_keys, com o recalculo como tarefa do
+    # event loop
+    while True:
+        await asyncio.sleep(CACHE_HOT_INTERVAL)
+        try:
+            for key, (loader, soft_ttl, hard_ttl) in hot_keys.take():
+                envelope = await get_envelope(key)
+                if envelope is None or envelope[0] - time.time() > CACHE_HOT_INTERVAL:
+                    continue
+                lock = await acquire_rebuild_lock(key)
+                if lock is not None:
+                    cache._count('hot_refreshes')
+                    run_in_background(refresh_in_background(key, loader, soft_ttl, hard_ttl, lock))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Erro ao recalcular chaves quentes do cache: %s", e)
+
+def start_hot_key_refresher():
+    global _hot_refresher
+    if CACHE_HOT_KEYS > 0 and (_hot_refresher is None or _hot_refresher.done()):
+        _hot_refresher = asyncio.get_running_loop().create_task(refresh_hot_keys())
+
+def run_in_background(coroutine):
+    task = asyncio.get_running_loop().create_task(coroutine)
+    _refreshes.add(task)
+    task.add_done_callback(_refreshes.discard)
+    return task
+
+async def cache_get_or_compute(key, loader, soft_ttl=CACHE_SOFT_TTL, hard_ttl=CACHE_HARD_TTL):
+    # Mesma semantica de cache.cache_get_or_compute, com loader assincrono
+    if key is None:
+        return await loader(), 'database'
+
+    start_hot_key_refresher()
+    hot_keys.record(key, (loader, soft_ttl, hard_ttl))
+    lookup = 'miss'
+    try:
+        envelope = await get_envelope(key)
+    except Exception as e:
+        logger.error("Erro ao ler cache: %s", e)
+        envelope = None
+        lookup = 'error'
+    if envelope is not None:
+        fresh_until, value = envelope
+        if fresh_until > time.time():
+            cache._count('fresh_hits')
+            metrics.record_lookup(key, 'hit')
+            return value, 'cache'
+        cache._count('stale_hits')
+        metrics.record_lookup(key, 'stale')
+        try:
+            lock = await acquire_rebuild_lock(key)
+            if lock is not None:
+                run_in_background(refresh_in_background(key, loader, soft_ttl, hard_ttl, lock))
+        except Exception as e:
+            logger.error("Erro ao agendar recalculo do cache: %s", e)
+        return value, 'stale'
+
+    lock = None
+    try:
+        lock = await acquire_rebuild_lock(key)
+        if lock is None:
+            cache._count('lock_waits')
+            deadline = time.monotonic() + CACHE_LOCK_WAIT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(CACHE_LOCK_POLL)
+                envelope = await get_envelope(key)
+                if envelope is not None:
+                    metrics.record_lookup(key, 'hit')
+                    return envelope[1], 'cache'
+            cache._count('lock_wait_timeouts')
+    except Exception as e:
+        logger.error("Erro na lease de recalculo do cache: %s", e)
+
+    metrics.record_lookup(key, lookup)
+    try:
+        cache._count('recomputes')
+        value = await loader()
+        if value is not None:
+            await store_envelope(key, value, soft_ttl, hard_ttl)
+        return value, 'database'
+    finally:
+        if lock is not None:
+            await release_rebuild_lock(lock)
+
+async def cache_response(key, render, soft_ttl=CACHE_SOFT_TTL, hard_ttl=CACHE_HARD_TTL):
+    # render() e uma corrotina que devolve o corpo JSON ja serializado
+    async def load():
+        body = await render()
+        return response_value(body) if body is not None else None
+
+    value, source = await cache_get_or_compute(key, load, soft_ttl, hard_ttl)
+    if value is None:
+        return None, None, source
+    etag, _, body = value.partition('\n')
+    return body, etag, source
+
+async def store_responses(entries, soft_ttl=CACHE_SOFT_TTL, hard_ttl=CACHE_HARD_TTL):
+    fresh_until = time.time() + soft_ttl
+    values = [(key, response_value(body)) for key, body in entries]
+    async with _client.pipeline(transaction=False) as pipe:
+        for key, value in values:
+            pipe.setex(key, hard_ttl, encode_envelope(value, fresh_until))
+        await pipe.execute()
+    for key, value in values:
+        local_cache.set(key, (fresh_until, value), hard_ttl)
+    logger.info("Cache SET - %s chaves em pipeline - Expiration: %ss", len(values), hard_ttl)
+    return len(values)
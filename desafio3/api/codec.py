@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+import zlib
+
+# Codificacao dos valores guardados no Redis. Os valores sao corpos de
+# resposta ja serializados (texto UTF-8); o primeiro byte indica o formato
+# dos dados que o seguem:
+#   r: texto sem compressao
+#   R: texto comprimido com zlib
+# Novos formatos entram em DECOMPRESSORS com um byte ainda livre, sem
+# invalidar o que ja esta no Redis
+
+# Abaixo desse tamanho (bytes) a compressao custa mais do que economiza
+CACHE_COMPRESS_MIN_SIZE = int(os.getenv('CACHE_COMPRESS_MIN_SIZE', 1024))
+CACHE_COMPRESS_LEVEL = int(os.getenv('CACHE_COMPRESS_LEVEL', 1))
+
+DECOMPRESSORS = {
+    b'r': lambda data: data,
+    b'R': zlib.decompress
+}
+
+_stats_lock = threading.Lock()
+_stats = {
+    'encodes': 0,
+    'decodes': 0,
+    'compressed': 0,
+    'serialized_bytes': 0,
+    'stored_bytes': 0,
+    'encode_seconds': 0.0,
+    'decode_seconds': 0.0
+}
+
+def encode(value):
+    start = time.perf_counter()
+    header, data = b'r', value.encode()
+    serialized = len(data)
+    compressed = False
+    if serialized >= CACHE_COMPRESS_MIN_SIZE:
+        packed = zlib.compress(data, CACHE_COMPRESS_LEVEL)
+        if len(packed) < serialized:
+            header, data, compressed = b'R', packed, True
+    elapsed = time.perf_counter() - start
+
+    with _stats_lock:
+        _stats['encodes'] += 1
+        _stats['compressed'] += compressed
+        _stats['serialized_bytes'] += serialized
+        _stats['stored_bytes'] += len(data) + 1
+        _stats['encode_seconds'] += elapsed
+    return header + data
+
+def decode(data):
+    start = time.perf_counter()
+    value = DECOMPRESSORS[data[:1]](data[1:]).decode()
+    elapsed = time.perf_counter() - start
+
+    with _stats_lock:
+        _stats['decodes'] += 1
+        _stats['decode_seconds'] += elapsed
+    return value
+
+def codec_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        'compress_min_size': CACHE_COMPRESS_MIN_SIZE,
+        'encodes': stats['encodes'],
+        'decodes': stats['decodes'],
+        'compressed': stats['compressed'],
+        'serialized_bytes': stats['serialized_bytes'],
+        'stored_bytes': stats['stored_bytes'],
+        'compression_ratio': round(stats['serialized_bytes'] / stats['stored_bytes'], 3) if stats['stored_bytes'] else 0.0,
+        'encode_avg_us': round(stats['encode_seconds'] / stats['encodes'] * 1e6, 1) if stats['encodes'] else 0.0,
+        'decode_avg_us': round(stats['decode_seconds'] / stats['decodes'] * 1e6, 1) if stats['decodes'] else 0.0
+    }
@@ -0,0 +1,254 @@
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+
+# Contrato das rotas compartilhado pela API sincrona (app.py) e pela
+# assincrona (app_async.py): validacao de parametros, cursores, chaves de
+# cache e formato dos corpos de resposta. Nada aqui faz I/O
+
+TASK_COLUMNS = ('id', 'title', 'description', 'status', 'created_at', 'updated_at')
+TASK_COLUMNS_SQL = ', '.join(TASK_COLUMNS)
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
+
+TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', 50))
+TASKS_MAX_PAGE_SIZE = int(os.getenv('TASKS_MAX_PAGE_SIZE', 500))
+TASKS_MAX_BATCH_SIZE = int(os.getenv('TASKS_MAX_BATCH_SIZE', 5000))
+TASKS_PAGE_PREFIX = 'tasks:page:'
+TASK_KEY_PREFIX = 'task_'
+# Geracoes do cache (ver cache.py): 'tasks' versiona paginas e buscas, 'task'
+# todas as tasks individuais e 'task:<id>' uma task so
+TASKS_NAMESPACE = 'tasks'
+TASK_ITEMS_NAMESPACE = 'task'
+# Escritas com mais ids do que isso trocam a geracao de todas as tasks em vez
+# de uma por id
+CACHE_INVALIDATE_MAX_IDS = int(os.getenv('CACHE_INVALIDATE_MAX_IDS', 500))
+TASKS_CHANGED_CHANNEL = 'tasks_changed'
+# Mesma configuracao da coluna gerada search_vector em banco/init.sql
+TASKS_SEARCH_CONFIG = 'portuguese'
+TASKS_SEARCH_PREFIX = 'tasks:search:'
+TASKS_SEARCH_MAX_LENGTH = int(os.getenv('TASKS_SEARCH_MAX_LENGTH', 200))
+TASKS_SEARCH_CACHE_TTL = int(os.getenv('TASKS_SEARCH_CACHE_TTL', 30))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# Aquecimento do cache na inicializacao e depois de cada limpeza: paginas de
+# GET /tasks (filtro e campos padrao) e tasks alteradas mais recentemente
+CACHE_WARMUP_PAGES = int(os.getenv('CACHE_WARMUP_PAGES', 3))
+CACHE_WARMUP_TASKS = int(os.getenv('CACHE_WARMUP_TASKS', 200))
+
+ENDPOINTS = {
+    'tasks': '/tasks?limit=&cursor=&status=&fields=',
+    'search_tasks': '/tasks/search?q=&limit=&cursor=',
+    'export_tasks': '/tasks/export?format=ndjson|csv&status=&fields=',
+    'task_by_id': '/tasks/<id>',
+    'create_task': 'POST /tasks',
+    'update_task': 'PUT /tasks/<id>',
+    'delete_task': 'DELETE /tasks/<id>',
+    'create_tasks_batch': 'POST /tasks/batch',
+    'update_tasks_batch': 'PATCH /tasks/batch',
+    'delete_tasks_batch': 'DELETE /tasks/batch',
+    'health': '/health',
+    'cache_stats': '/cache/stats',
+    'metrics': '/metrics'
+}
+
+def serialize_task(task):
+    if not task:
+        return None
+
+    task_dict = dict(task)
+
+    if 'created_at' in task_dict and task_dict['created_at']:
+        task_dict['created_at'] = task_dict['created_at'].isoformat()
+    if 'updated_at' in task_dict and task_dict['updated_at']:
+        task_dict['updated_at'] = task_dict['updated_at'].isoformat()
+
+    return task_dict
+
+def encode_cursor(task):
+    # Cursor opaco com a chave (created_at, id) do ultimo item da pagina
+    raw = f"{task['created_at'].isoformat()}|{task['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, task_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(task_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_status(args):
+    status = args.get('status')
+    if status and status not in TASK_STATUSES:
+        raise ValueError(f"status must be one of: {', '.join(TASK_STATUSES)}")
+    return status
+
+def parse_fields(args):
+    fields = TASK_COLUMNS
+    if args.get('fields'):
+        fields = tuple(dict.fromkeys(field.strip() for field in args['fields'].split(',') if field.strip()))
+        invalid = [field for field in fields if field not in TASK_COLUMNS]
+        if invalid or not fields:
+            raise ValueError(f"fields must be a subset of: {', '.join(TASK_COLUMNS)}")
+    return fields
+
+def parse_page_args(args):
+    limit = args.get('limit', TASKS_PAGE_SIZE, type=int)
+    if not 1 <= limit <= TASKS_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {TASKS_MAX_PAGE_SIZE}')
+
+    cursor = args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+
+    return limit, after, parse_status(args), parse_fields(args)
+
+def parse_export_args(args):
+    export_format = args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return export_format, parse_status(args), parse_fields(args)
+
+def encode_search_cursor(task):
+    # Continua a busca depois do par (rank, id) do ultimo resultado
+    raw = f"{task['rank']!r}|{task['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_search_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rank, task_id = raw.split('|')
+        return float(rank), int(task_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_search_args(args):
+    # A consulta e normalizada (minusculas, espacos colapsados) para que
+    # variacoes triviais caiam na mesma entrada de cache
+    query = ' '.join(args.get('q', '').lower().split())
+    if not query:
+        raise ValueError('q is required')
+    if len(query) > TASKS_SEARCH_MAX_LENGTH:
+        raise ValueError(f'q must be at most {TASKS_SEARCH_MAX_LENGTH} characters')
+
+    limit = args.get('limit', TASKS_PAGE_SIZE, type=int)
+    if not 1 <= limit <= TASKS_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {TASKS_MAX_PAGE_SIZE}')
+
+    cursor = args.get('cursor')
+    after = decode_search_cursor(cursor) if cursor else None
+    return query, limit, after
+
+def parse_batch(data, required):
+    # Corpo {"tasks": [...]} (ou a lista diretamente), validado por inteiro
+    # antes de qualquer escrita
+    items = data.get('tasks') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        raise ValueError('Body must be a non-empty list of tasks')
+    if len(items) > TASKS_MAX_BATCH_SIZE:
+        raise ValueError(f'Batch size must be at most {TASKS_MAX_BATCH_SIZE}')
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'Item {index} must be an object')
+        missing = [field for field in required if item.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"Item {index}: {', '.join(missing)} is required")
+        if 'id' in required and not isinstance(item['id'], int):
+            raise ValueError(f'Item {index}: id must be an integer')
+        if item.get('status') and item['status'] not in TASK_STATUSES:
+            raise ValueError(f"Item {index}: status must be one of: {', '.join(TASK_STATUSES)}")
+    return items
+
+def parse_batch_ids(data):
+    ids = data.get('ids') if isinstance(data, dict) else data
+    if not isinstance(ids, list) or not ids or not all(isinstance(task_id, int) for task_id in ids):
+        raise ValueError('Body must be a non-empty list of integer ids')
+    if len(ids) > TASKS_MAX_BATCH_SIZE:
+        raise ValueError(f'Batch size must be at most {TASKS_MAX_BATCH_SIZE}')
+    return set(ids)
+
+def page_cache_key(status, fields, limit, cursor):
+    # Uma entrada de cache por combinacao de filtro/campos/tamanho/cursor
+    return f"{TASKS_PAGE_PREFIX}{status or '*'}:{','.join(fields)}:{limit}:{cursor or 'first'}"
+
+def search_cache_key(query, limit, cursor):
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return f"{TASKS_SEARCH_PREFIX}{digest}:{limit}:{cursor or 'first'}"
+
+def task_key(task_id):
+    return f'{TASK_KEY_PREFIX}{task_id}'
+
+def task_namespaces(task_id):
+    return TASK_ITEMS_NAMESPACE, f'{TASK_ITEMS_NAMESPACE}:{task_id}'
+
+def changed_task_namespaces(task_ids):
+    # Namespaces a invalidar depois de uma escrita nos ids informados, alem
+    # de TASKS_NAMESPACE
+    if len(task_ids) > CACHE_INVALIDATE_MAX_IDS:
+        return [TASK_ITEMS_NAMESPACE]
+    return [task_namespaces(task_id)[1] for task_id in sorted(task_ids)]
+
+def page_payload(tasks, has_more, fields):
+    tasks_list = [serialize_task({field: task[field] for field in fields}) for task in tasks]
+    return {
+        'count': len(tasks_list),
+        'tasks': tasks_list,
+        'next_cursor': encode_cursor(tasks[-1]) if has_more else None
+    }
+
+def search_payload(query, tasks, has_more):
+    tasks_list = [serialize_task(task) for task in tasks]
+    return {
+        'query': query,
+        'count': len(tasks_list),
+        'tasks': tasks_list,
+        'next_cursor': encode_search_cursor(tasks[-1]) if has_more else None
+    }
+
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def encode_ndjson(rows, fields):
+    # Um objeto JSON por linha; rows sao tuplas na ordem de fields
+    return ''.join(
+        json.dumps(dict(zip(fields, map(export_value, row))), separators=(',', ':')) + '\n'
+        for row in rows
+    )
+
+def encode_csv(rows, fields=None):
+    # fields, quando informado, vira a linha de cabecalho
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fields:
+        writer.writerow(fields)
+    writer.writerows([export_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+def encode_export(export_format, rows, fields, first):
+    if export_format == 'csv':
+        return encode_csv(rows, fields if first else None)
+    return encode_ndjson(rows, fields)
+
+def render_body(payload):
+    return json.dumps(payload, separators=(',', ':')) if payload is not None else None
+
+def response_body(body, source):
+    # O corpo cacheado nao tem o campo source: ele e concatenado na frente,
+    # sem desserializar o restante
+    origin = 'database' if source == 'database' else 'cache'
+    return f'{{"source":"{origin}",{body[1:]}'
+
+def parse_task_notification(payload):
+    # Payload do NOTIFY de banco/init.sql: '<txid>:<ids>', com os ids
+    # separados por virgula, ou '*' quando nao cabem. Retorna (token, ids):
+    # token e o txid em texto, o mesmo que a rota que fez a escrita registra
+    # (None no formato antigo, sem txid), e ids None significa invalidar tudo
+    token = None
+    if ':' in payload:
+        token, payload = payload.split(':', 1)
+    if payload == '*':
+        return token, None
+    return token, {int(task_id) for task_id in payload.split(',') if task_id}
@@ -0,0 +1,185 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contract import TASK_KEY_PREFIX, TASKS_PAGE_PREFIX, TASKS_SEARCH_PREFIX
+
+# Registro de metricas em memoria do processo, exposto em /metrics no formato
+# texto do Prometheus. Registrar uma amostra custa um lock curto e alguns
+# incrementos em listas ja alocadas (os buckets sao fixos), entao pode ficar
+# sempre ligado. Cada processo tem o seu registro: com varios workers, cada
+# um e uma serie separada no scrape
+
+# Limites superiores (em segundos) dos buckets dos histogramas
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self, lines):
+        with self.lock:
+            series = sorted(self.series.items())
+        for labels, value in series:
+            lines.append(f'{self.name}{format_labels(self.labels, labels)} {value}')
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # Por serie: uma contagem por bucket, o excedente (+Inf) e a soma
+        self.series = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.series.get(labels)
+            if counts is None:
+                counts = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self, lines):
+        with self.lock:
+            series = sorted((labels, list(counts)) for labels, counts in self.series.items())
+        for labels, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else format(bound, 'g')
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, labels, [('le', le)])} {cumulative}")
+            label_text = format_labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{label_text} {counts[-1]:.6f}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+
+REQUEST_DURATION = Histogram(
+    'tasks_api_request_duration_seconds', 'Latencia das requisicoes HTTP por rota',
+    ('method', 'route', 'status')
+)
+CACHE_LOOKUPS = Counter(
+    'tasks_api_cache_lookups_total', 'Consultas ao cache por familia de chave e resultado',
+    ('family', 'result')
+)
+DB_DURATION = Histogram(
+    'tasks_api_db_query_duration_seconds', 'Tempo das operacoes no PostgreSQL (inclui a espera pelo pool)',
+    ('operation',), QUERY_BUCKETS
+)
+DB_ERRORS = Counter('tasks_api_db_query_errors_total', 'Operacoes no PostgreSQL que falharam', ('operation',))
+REDIS_DURATION = Histogram(
+    'tasks_api_redis_command_duration_seconds', 'Tempo de ida e volta dos comandos ao Redis',
+    ('command',), QUERY_BUCKETS
+)
+REDIS_ERRORS = Counter('tasks_api_redis_command_errors_total', 'Comandos ao Redis que falharam', ('command',))
+
+def key_family(key):
+    # Agrupa as chaves pelo prefixo, sem o sufixo de geracao: o numero de
+    # series nao cresce com o numero de chaves
+    if key.startswith(TASKS_PAGE_PREFIX):
+        return 'tasks_page'
+    if key.startswith(TASKS_SEARCH_PREFIX):
+        return 'tasks_search'
+    if key.startswith(TASK_KEY_PREFIX):
+        return 'task'
+    return 'other'
+
+def record_lookup(key, result):
+    # result: 'hit', 'stale', 'miss' ou 'error' (uma contagem por consulta)
+    CACHE_LOOKUPS.inc(key_family(key), result)
+
+def timed_query(operation):
+    # Decorator das funcoes de models.py/models_async.py (sincronas ou
+    # corrotinas): mede a duracao e conta as falhas por operacao
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                except Exception:
+                    DB_ERRORS.inc(operation)
+                    raise
+                finally:
+                    DB_DURATION.observe(time.perf_counter() - start, operation)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.inc(operation)
+                raise
+            finally:
+                DB_DURATION.observe(time.perf_counter() - start, operation)
+        return wrapper
+    return decorator
+
+def snapshot_metrics(pool, local, swr, codec):
+    # Valores que ja existem nas estatisticas do pool e do cache, lidos so
+    # no momento do scrape
+    snapshot = [
+        ('tasks_api_db_pool_in_use', 'gauge', 'Conexoes do pool em uso', pool['in_use']),
+        ('tasks_api_db_pool_max', 'gauge', 'Tamanho maximo do pool', pool['max_size']),
+        ('tasks_api_local_cache_entries', 'gauge', 'Entradas no cache local', local['entries']),
+        ('tasks_api_local_cache_hits_total', 'counter', 'Hits no cache local', local['hits']),
+        ('tasks_api_local_cache_misses_total', 'counter', 'Misses no cache local', local['misses']),
+        ('tasks_api_local_cache_evictions_total', 'counter', 'Evicoes do cache local', local['evictions'])
+    ]
+    for name, value in swr.items():
+        snapshot.append((f'tasks_api_swr_{name}_total', 'counter', f'Stale-while-revalidate: {name}', value))
+    snapshot += [
+        ('tasks_api_cache_serialized_bytes_total', 'counter', 'Bytes dos valores em cache antes da compressao',
+         codec['serialized_bytes']),
+        ('tasks_api_cache_stored_bytes_total', 'counter', 'Bytes dos valores em cache enviados ao Redis',
+         codec['stored_bytes']),
+        ('tasks_api_cache_compression_ratio', 'gauge', 'Bytes serializados por byte guardado',
+         codec['compression_ratio'])
+    ]
+    return snapshot
+
+def render(snapshot=()):
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        metric.render(lines)
+    for name, kind, help_text, value in snapshot:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
@@ -1,6 +1,17 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from contextlib import contextmanager
+import logging
 import os
+import select
+import threading
+import time
+import metrics
+from contract import TASK_COLUMNS, TASK_COLUMNS_SQL, TASKS_CHANGED_CHANNEL, TASKS_SEARCH_CONFIG, parse_task_notification
+
+logger = logging.getLogger(__name__)
 
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'banco-dados'),
@@ -10,47 +21,271 @@ DB_CONFIG = {
     'port': int(os.getenv('DB_PORT', 5432))
 }
 
-def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'
+DB_BATCH_PAGE_SIZE = int(os.getenv('DB_BATCH_PAGE_SIZE', 1000))
+DB_EXPORT_BATCH_SIZE = int(os.getenv('DB_EXPORT_BATCH_SIZE', 2000))
+DB_NOTIFY_ENABLED = os.getenv('DB_NOTIFY_ENABLED', 'true').lower() == 'true'
+# Keepalive TCP na conexao do LISTEN: sem ele uma queda silenciosa da rede
+# deixaria o listener esperando para sempre
+DB_LISTEN_KEEPALIVE = {'keepalives': 1, 'keepalives_idle': 30, 'keepalives_interval': 10, 'keepalives_count': 3}
+
+_pool = None
+_pool_lock = threading.Lock()
+# O semaforo limita os checkouts ao tamanho maximo do pool, permitindo
+# esperar com timeout (o ThreadedConnectionPool falha na hora se esgotado)
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_stats_lock = threading.Lock()
+_stats = {
+    'checkouts': 0,
+    'in_use': 0,
+    'wait_total': 0.0,
+    'wait_max': 0.0,
+    'timeouts': 0,
+    'discarded': 0
+}
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, cursor_factory=RealDictCursor, **DB_CONFIG
+                )
+    return _pool
+
+def _is_broken(conn):
+    if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+        return True
+    if DB_POOL_PRE_PING:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return True
+    return False
+
+def _checkout(pool):
+    # Conexoes derrubadas (restart do banco, timeout de rede) sao descartadas
+    # e substituidas por novas antes de chegar ao chamador
+    for _ in range(DB_POOL_MAX + 1):
+        conn = pool.getconn()
+        if not _is_broken(conn):
+            return conn
+        pool.putconn(conn, close=True)
+        with _stats_lock:
+            _stats['discarded'] += 1
+    raise PoolError("Nao foi possivel obter uma conexao valida do pool")
+
+@contextmanager
+def get_connection():
+    start = time.perf_counter()
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        with _stats_lock:
+            _stats['timeouts'] += 1
+        raise PoolError(f"Timeout de {DB_POOL_TIMEOUT}s aguardando conexao do pool")
+
+    pool = None
+    conn = None
+    broken = False
+    try:
+        pool = get_pool()
+        conn = _checkout(pool)
+        waited = time.perf_counter() - start
+        with _stats_lock:
+            _stats['checkouts'] += 1
+            _stats['in_use'] += 1
+            _stats['wait_total'] += waited
+            _stats['wait_max'] = max(_stats['wait_max'], waited)
 
-def get_all_tasks():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks ORDER BY created_at DESC')
-    tasks = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return tasks
+        yield conn
+
+        # Leituras abrem transacao implicitamente: a conexao volta ao pool
+        # sem transacao pendente
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    except Exception:
+        if conn is not None and not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        raise
+    finally:
+        if conn is not None:
+            with _stats_lock:
+                _stats['in_use'] -= 1
+            pool.putconn(conn, close=broken or bool(conn.closed))
+        _slots.release()
+
+def listen_task_changes(on_change, on_reset):
+    # Conexao dedicada (fora do pool) em LISTEN no canal dos triggers de
+    # banco/init.sql. As notificacoes que chegam juntas viram uma unica
+    # chamada on_change(notifications), uma lista de pares (token, ids) de
+    # parse_task_notification. on_reset() e chamado a cada conexao, inclusive
+    # a primeira, pois notificacoes emitidas sem listener conectado (antes do
+    # processo subir ou durante uma queda) nao sao reenviadas
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**DB_CONFIG, **DB_LISTEN_KEEPALIVE)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {TASKS_CHANGED_CHANNEL}')
+            on_reset()
+            while True:
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                notifications = [parse_task_notification(notify.payload) for notify in conn.notifies]
+                conn.notifies.clear()
+                if notifications:
+                    on_change(notifications)
+        except Exception as e:
+            logger.error("Erro no listener de alteracoes de tasks: %s", e)
+            time.sleep(1)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def pool_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    checkouts = stats['checkouts']
+    return {
+        'min_size': DB_POOL_MIN,
+        'max_size': DB_POOL_MAX,
+        'in_use': stats['in_use'],
+        'utilization': round(stats['in_use'] / DB_POOL_MAX, 3),
+        'checkouts': checkouts,
+        'wait_avg_ms': round(stats['wait_total'] / checkouts * 1000, 3) if checkouts else 0.0,
+        'wait_max_ms': round(stats['wait_max'] * 1000, 3),
+        'timeouts': stats['timeouts'],
+        'discarded_connections': stats['discarded']
+    }
+
+@metrics.timed_query('get_tasks_page')
+def get_tasks_page(limit, after=None, status=None, columns=TASK_COLUMNS):
+    # Paginacao por chave em (created_at, id): cada pagina e uma busca no
+    # indice a partir do ultimo item, sem OFFSET. created_at e id sempre sao
+    # lidos para montar o cursor da proxima pagina
+    selected = list(dict.fromkeys(list(columns) + ['created_at', 'id']))
+    conditions = []
+    params = []
+
+    if status:
+        conditions.append('status = %s')
+        params.append(status)
+    if after:
+        conditions.append('(created_at, id) < (%s, %s)')
+        params.extend(after)
 
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f"SELECT {', '.join(selected)} FROM tasks {where} ORDER BY created_at DESC, id DESC LIMIT %s"
+    # Uma linha a mais indica se existe proxima pagina
+    params.append(limit + 1)
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
+
+def iter_tasks(columns=TASK_COLUMNS, status=None, batch_size=DB_EXPORT_BATCH_SIZE):
+    # Cursor nomeado (do lado do servidor): o resultado fica no PostgreSQL e
+    # chega em lotes de batch_size tuplas, entao a memoria da API nao cresce
+    # com a tabela. A conexao fica reservada ate o gerador terminar ou ser
+    # fechado (cliente desconectou)
+    where = 'WHERE status = %s' if status else ''
+    with get_connection() as conn:
+        with conn.cursor(name='tasks_export', cursor_factory=psycopg2.extensions.cursor) as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(f"SELECT {', '.join(columns)} FROM tasks {where} ORDER BY id", [status] if status else [])
+            while True:
+                start = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                metrics.DB_DURATION.observe(time.perf_counter() - start, 'iter_tasks')
+                if not rows:
+                    break
+                yield rows
+
+@metrics.timed_query('search_tasks')
+def search_tasks(query, limit, after=None):
+    # Busca textual pelo indice GIN de search_vector (websearch_to_tsquery
+    # aceita a sintaxe de buscadores: "frase", -exclusao, or). Ordenada por
+    # relevancia e paginada por chave em (rank, id)
+    condition = 'WHERE (rank, id) < (%s::real, %s)' if after else ''
+    sql = f"""SELECT * FROM (
+                  SELECT {TASK_COLUMNS_SQL}, ts_rank_cd(search_vector, query) AS rank
+                  FROM tasks, websearch_to_tsquery('{TASKS_SEARCH_CONFIG}', %s) AS query
+                  WHERE search_vector @@ query
+              ) AS matches
+              {condition}
+              ORDER BY rank DESC, id DESC
+              LIMIT %s"""
+    params = [query, *(after or ()), limit + 1]
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
+
+@metrics.timed_query('get_task_by_id')
 def get_task_by_id(task_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks WHERE id = %s', (task_id,))
-    task = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return task
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f'SELECT {TASK_COLUMNS_SQL} FROM tasks WHERE id = %s', (task_id,))
+            return cursor.fetchone()
+
+@metrics.timed_query('get_recent_tasks')
+def get_recent_tasks(limit):
+    # Tasks alteradas mais recentemente (indice idx_tasks_updated_at), para
+    # o aquecimento do cache
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f'SELECT {TASK_COLUMNS_SQL} FROM tasks ORDER BY updated_at DESC, id DESC LIMIT %s', (limit,))
+            return cursor.fetchall()
+
+# As escritas devolvem tambem txid_current(): o mesmo id de transacao que os
+# triggers colocam no NOTIFY, para a rota registrar a notificacao que ela
+# mesma ja invalidou (app.invalidate_tasks)
+RETURNING_TXID = 'txid_current() AS txid'
+
+def split_txid(rows):
+    # (linhas sem a coluna txid, txid), com txid None se nada foi alterado
+    rows = [dict(row) for row in rows]
+    txid = None
+    for row in rows:
+        txid = row.pop('txid')
+    return rows, txid
 
+@metrics.timed_query('create_task')
 def create_task(title, description, status='pending'):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO tasks (title, description, status) VALUES (%s, %s, %s) RETURNING *',
-        (title, description, status)
-    )
-    task = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return task
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO tasks (title, description, status) VALUES (%s, %s, %s) '
+                f'RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}',
+                (title, description, status)
+            )
+            rows = cursor.fetchall()
+        conn.commit()
+        tasks, txid = split_txid(rows)
+        return tasks[0], txid
 
+@metrics.timed_query('update_task')
 def update_task(task_id, title=None, description=None, status=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     updates = []
     params = []
-    
+
     if title:
         updates.append('title = %s')
         params.append(title)
@@ -60,24 +295,77 @@ def update_task(task_id, title=None, description=None, status=None):
     if status:
         updates.append('status = %s')
         params.append(status)
-    
+
     updates.append('updated_at = CURRENT_TIMESTAMP')
     params.append(task_id)
-    
-    query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = %s RETURNING *"
-    cursor.execute(query, params)
-    task = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return task
 
+    query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = %s RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}"
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        conn.commit()
+        tasks, txid = split_txid(rows)
+        return (tasks[0] if tasks else None), txid
+
+@metrics.timed_query('delete_task')
 def delete_task(task_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tasks WHERE id = %s RETURNING *', (task_id,))
-    task = cursor.fetchone()
-    conn.commit()
-    cursor.close()
-    conn.close()
-    return task
\ No newline at end of file
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DELETE FROM tasks WHERE id = %s RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}', (task_id,))
+            rows = cursor.fetchall()
+        conn.commit()
+        tasks, txid = split_txid(rows)
+        return (tasks[0] if tasks else None), txid
+
+# Operacoes em lote: cada uma e uma unica transacao, com as linhas enviadas
+# em comandos de DB_BATCH_PAGE_SIZE linhas pelo execute_values
+
+@metrics.timed_query('create_tasks')
+def create_tasks(items):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            tasks = execute_values(
+                cursor,
+                f'INSERT INTO tasks (title, description, status) VALUES %s RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}',
+                [(item['title'], item.get('description', ''), item.get('status', 'pending')) for item in items],
+                page_size=DB_BATCH_PAGE_SIZE,
+                fetch=True
+            )
+        conn.commit()
+        return split_txid(tasks)
+
+@metrics.timed_query('update_tasks')
+def update_tasks(items):
+    # Campos ausentes (ou vazios, como em update_task) mantem o valor atual
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            tasks = execute_values(
+                cursor,
+                f"""UPDATE tasks AS t SET
+                       title = COALESCE(v.title, t.title),
+                       description = COALESCE(v.description, t.description),
+                       status = COALESCE(v.status, t.status),
+                       updated_at = CURRENT_TIMESTAMP
+                   FROM (VALUES %s) AS v (id, title, description, status)
+                   WHERE t.id = v.id
+                   RETURNING {', '.join(f't.{column}' for column in TASK_COLUMNS)}, {RETURNING_TXID}""",
+                [(item['id'], item.get('title') or None, item.get('description') or None,
+                  item.get('status') or None) for item in items],
+                template='(%s::integer, %s::varchar, %s::text, %s::varchar)',
+                page_size=DB_BATCH_PAGE_SIZE,
+                fetch=True
+            )
+        conn.commit()
+        return split_txid(tasks)
+
+@metrics.timed_query('delete_tasks')
+def delete_tasks(task_ids):
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM tasks WHERE id = ANY(%s) RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}', (list(task_ids),)
+            )
+            tasks = cursor.fetchall()
+        conn.commit()
+        return split_txid(tasks)
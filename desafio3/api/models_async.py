@@ -0,0 +1,241 @@
+import asyncio
+import asyncpg
+import logging
+import os
+import time
+import metrics
+from contract import TASK_COLUMNS, TASK_COLUMNS_SQL, TASKS_CHANGED_CHANNEL, TASKS_SEARCH_CONFIG, parse_task_notification
+from models import (
+    DB_CONFIG, DB_EXPORT_BATCH_SIZE, DB_NOTIFY_ENABLED, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, RETURNING_TXID,
+    split_txid
+)
+
+logger = logging.getLogger(__name__)
+
+# Mesmas consultas de models.py sobre um pool do asyncpg: enquanto uma
+# consulta espera o banco, o event loop atende outras requisicoes, sem uma
+# thread presa por conexao. Placeholders no formato $n do asyncpg
+
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+
+_pool = None
+
+async def init_pool():
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=DB_CONFIG['host'],
+            database=DB_CONFIG['database'],
+            user=DB_CONFIG['user'],
+            password=DB_CONFIG['password'],
+            port=DB_CONFIG['port'],
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE
+        )
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def get_connection():
+    # Espera no maximo DB_POOL_TIMEOUT segundos por uma conexao livre, como
+    # o pool sincrono
+    return _pool.acquire(timeout=DB_POOL_TIMEOUT)
+
+async def listen_task_changes(on_change, on_reset):
+    # Equivalente a models.listen_task_changes: conexao dedicada em LISTEN,
+    # notificacoes acumuladas em uma fila e aplicadas em conjunto, on_reset()
+    # a cada conexao. O SELECT 1 periodico detecta conexoes perdidas
+    while True:
+        conn = None
+        queue = asyncio.Queue()
+        try:
+            conn = await asyncpg.connect(
+                host=DB_CONFIG['host'], database=DB_CONFIG['database'], user=DB_CONFIG['user'],
+                password=DB_CONFIG['password'], port=DB_CONFIG['port']
+            )
+            await conn.add_listener(TASKS_CHANGED_CHANNEL, lambda *args: queue.put_nowait(args[3]))
+            await on_reset()
+            while True:
+                try:
+                    payloads = [await asyncio.wait_for(queue.get(), 5)]
+                except asyncio.TimeoutError:
+                    await conn.execute('SELECT 1')
+                    continue
+                while not queue.empty():
+                    payloads.append(queue.get_nowait())
+
+                await on_change([parse_task_notification(payload) for payload in payloads])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Erro no listener de alteracoes de tasks: %s", e)
+            await asyncio.sleep(1)
+        finally:
+            if conn is not None:
+                await conn.close()
+
+def pool_stats():
+    if _pool is None:
+        return {'min_size': DB_POOL_MIN, 'max_size': DB_POOL_MAX, 'size': 0, 'in_use': 0, 'utilization': 0.0}
+    in_use = _pool.get_size() - _pool.get_idle_size()
+    return {
+        'min_size': _pool.get_min_size(),
+        'max_size': _pool.get_max_size(),
+        'size': _pool.get_size(),
+        'in_use': in_use,
+        'utilization': round(in_use / _pool.get_max_size(), 3)
+    }
+
+@metrics.timed_query('get_tasks_page')
+async def get_tasks_page(limit, after=None, status=None, columns=TASK_COLUMNS):
+    selected = list(dict.fromkeys(list(columns) + ['created_at', 'id']))
+    conditions = []
+    params = []
+
+    if status:
+        params.append(status)
+        conditions.append(f'status = ${len(params)}')
+    if after:
+        params.extend(after)
+        conditions.append(f'(created_at, id) < (${len(params) - 1}, ${len(params)})')
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    params.append(limit + 1)
+    query = f"SELECT {', '.join(selected)} FROM tasks {where} ORDER BY created_at DESC, id DESC LIMIT ${len(params)}"
+
+    async with get_connection() as conn:
+        rows = await conn.fetch(query, *params)
+    return rows[:limit], len(rows) > limit
+
+async def iter_tasks(columns=TASK_COLUMNS, status=None, batch_size=DB_EXPORT_BATCH_SIZE):
+    # Cursor do asyncpg (exige transacao): lotes de batch_size registros
+    where = 'WHERE status = $1' if status else ''
+    query = f"SELECT {', '.join(columns)} FROM tasks {where} ORDER BY id"
+    async with get_connection() as conn:
+        async with conn.transaction(readonly=True):
+            cursor = await conn.cursor(query, *([status] if status else []))
+            while True:
+                start = time.perf_counter()
+                rows = await cursor.fetch(batch_size)
+                metrics.DB_DURATION.observe(time.perf_counter() - start, 'iter_tasks')
+                if not rows:
+                    break
+                yield rows
+
+@metrics.timed_query('search_tasks')
+async def search_tasks(query, limit, after=None):
+    condition = 'WHERE (rank, id) < ($2::real, $3)' if after else ''
+    sql = f"""SELECT * FROM (
+                  SELECT {TASK_COLUMNS_SQL}, ts_rank_cd(search_vector, query) AS rank
+                  FROM tasks, websearch_to_tsquery('{TASKS_SEARCH_CONFIG}', $1) AS query
+                  WHERE search_vector @@ query
+              ) AS matches
+              {condition}
+              ORDER BY rank DESC, id DESC
+              LIMIT ${2 + (2 if after else 0)}"""
+
+    async with get_connection() as conn:
+        rows = await conn.fetch(sql, query, *(after or ()), limit + 1)
+    return rows[:limit], len(rows) > limit
+
+@metrics.timed_query('get_task_by_id')
+async def get_task_by_id(task_id):
+    async with get_connection() as conn:
+        return await conn.fetchrow(f'SELECT {TASK_COLUMNS_SQL} FROM tasks WHERE id = $1', task_id)
+
+@metrics.timed_query('get_recent_tasks')
+async def get_recent_tasks(limit):
+    async with get_connection() as conn:
+        return await conn.fetch(f'SELECT {TASK_COLUMNS_SQL} FROM tasks ORDER BY updated_at DESC, id DESC LIMIT $1', limit)
+
+@metrics.timed_query('create_task')
+async def create_task(title, description, status='pending'):
+    # Como em models.py, as escritas devolvem (resultado, txid)
+    async with get_connection() as conn:
+        rows = await conn.fetch(
+            f'INSERT INTO tasks (title, description, status) VALUES ($1, $2, $3) '
+            f'RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}',
+            title, description, status
+        )
+    tasks, txid = split_txid(rows)
+    return tasks[0], txid
+
+@metrics.timed_query('update_task')
+async def update_task(task_id, title=None, description=None, status=None):
+    updates = []
+    params = []
+
+    if title:
+        params.append(title)
+        updates.append(f'title = ${len(params)}')
+    if description:
+        params.append(description)
+        updates.append(f'description = ${len(params)}')
+    if status:
+        params.append(status)
+        updates.append(f'status = ${len(params)}')
+
+    updates.append('updated_at = CURRENT_TIMESTAMP')
+    params.append(task_id)
+
+    query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ${len(params)} RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}"
+    async with get_connection() as conn:
+        rows = await conn.fetch(query, *params)
+    tasks, txid = split_txid(rows)
+    return (tasks[0] if tasks else None), txid
+
+@metrics.timed_query('delete_task')
+async def delete_task(task_id):
+    async with get_connection() as conn:
+        rows = await conn.fetch(f'DELETE FROM tasks WHERE id = $1 RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}', task_id)
+    tasks, txid = split_txid(rows)
+    return (tasks[0] if tasks else None), txid
+
+# Lotes: um unico comando por lote, com as colunas enviadas como arrays e
+# expandidas por unnest() no servidor
+
+@metrics.timed_query('create_tasks')
+async def create_tasks(items):
+    async with get_connection() as conn:
+        rows = await conn.fetch(
+            f"""INSERT INTO tasks (title, description, status)
+               SELECT * FROM unnest($1::varchar[], $2::text[], $3::varchar[])
+               RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}""",
+            [item['title'] for item in items],
+            [item.get('description', '') for item in items],
+            [item.get('status', 'pending') for item in items]
+        )
+    return split_txid(rows)
+
+@metrics.timed_query('update_tasks')
+async def update_tasks(items):
+    async with get_connection() as conn:
+        rows = await conn.fetch(
+            f"""UPDATE tasks AS t SET
+                   title = COALESCE(v.title, t.title),
+                   description = COALESCE(v.description, t.description),
+                   status = COALESCE(v.status, t.status),
+                   updated_at = CURRENT_TIMESTAMP
+               FROM unnest($1::integer[], $2::varchar[], $3::text[], $4::varchar[])
+                   AS v (id, title, description, status)
+               WHERE t.id = v.id
+               RETURNING {', '.join(f't.{column}' for column in TASK_COLUMNS)}, {RETURNING_TXID}""",
+            [item['id'] for item in items],
+            [item.get('title') or None for item in items],
+            [item.get('description') or None for item in items],
+            [item.get('status') or None for item in items]
+        )
+    return split_txid(rows)
+
+@metrics.timed_query('delete_tasks')
+async def delete_tasks(task_ids):
+    async with get_connection() as conn:
+        rows = await conn.fetch(
+            f'DELETE FROM tasks WHERE id = ANY($1::integer[]) RETURNING {TASK_COLUMNS_SQL}, {RETURNING_TXID}', list(task_ids)
+        )
+    return split_txid(rows)
@@ -3,11 +3,65 @@ CREATE TABLE IF NOT EXISTS tasks (
     title VARCHAR(200) NOT NULL,
     description TEXT,
     status VARCHAR(20) DEFAULT 'pending',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Documento da busca textual de GET /tasks/search, mantido pelo proprio
+    -- banco: titulo com peso A, descricao com peso B
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(description, '')), 'B')
+    ) STORED
 );
 
-CREATE INDEX idx_tasks_status ON tasks(status);
+-- Indices da paginacao por chave de GET /tasks (ORDER BY created_at DESC, id DESC);
+-- idx_tasks_status continua atendendo filtros so por status pelo prefixo
+CREATE INDEX idx_tasks_status ON tasks(status, created_at DESC, id DESC);
+CREATE INDEX idx_tasks_created_at_id ON tasks(created_at DESC, id DESC);
+-- Tasks alteradas mais recentemente, lidas no aquecimento do cache da API
+CREATE INDEX idx_tasks_updated_at ON tasks(updated_at DESC, id DESC);
+CREATE INDEX idx_tasks_search ON tasks USING GIN (search_vector);
+
+-- Invalidacao do cache dirigida pelo banco: qualquer escrita em tasks (API,
+-- migracoes, seeds, outros servicos) envia um NOTIFY no canal tasks_changed
+-- com os ids alterados, entregue no COMMIT. Triggers por comando com tabelas
+-- de transicao: um lote de milhares de linhas gera uma unica notificacao.
+-- Payloads acima do limite do NOTIFY (8000 bytes) e TRUNCATE viram '*'. O
+-- payload comeca com o id da transacao ('<txid>:<ids>'), que permite a um
+-- unico processo da API invalidar o Redis por notificacao
+CREATE OR REPLACE FUNCTION notify_tasks_changed() RETURNS trigger AS $$
+DECLARE
+    payload TEXT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT string_agg(id::text, ',') INTO payload FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT string_agg(id::text, ',') INTO payload
+        FROM (SELECT id FROM old_rows UNION SELECT id FROM new_rows) AS changed;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT string_agg(id::text, ',') INTO payload FROM old_rows;
+    END IF;
+
+    IF TG_OP = 'TRUNCATE' OR length(payload) > 7900 THEN
+        payload := '*';
+    END IF;
+    IF payload IS NOT NULL THEN
+        PERFORM pg_notify('tasks_changed', txid_current() || ':' || payload);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_notify_insert AFTER INSERT ON tasks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_tasks_changed();
+CREATE TRIGGER tasks_notify_update AFTER UPDATE ON tasks
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_tasks_changed();
+CREATE TRIGGER tasks_notify_delete AFTER DELETE ON tasks
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_tasks_changed();
+CREATE TRIGGER tasks_notify_truncate AFTER TRUNCATE ON tasks
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_tasks_changed();
 
 INSERT INTO tasks (title, description, status) VALUES
     ('Estudar para a prova', 'estudar microserviços e docker', 'in_progress'),
@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+# Compara a API sincrona (Flask, porta 5000) com a assincrona (Quart/ASGI,
+# porta 5001) sob alta concorrencia. Cliente em malha fechada: cada uma das
+# N conexoes envia a proxima requisicao assim que recebe a anterior. Usa so a
+# biblioteca padrao (HTTP/1.1 cru sobre asyncio), entao roda do host:
+#   python benchmark.py --concurrency 500 --duration 20
+#   python benchmark.py --path '/tasks/{id}' --ids 1-5000
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = {}
+
+    def add_error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def percentile(self, percentile):
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(round(percentile / 100.0 * len(self.latencies) + 0.4999)) - 1)
+        return self.latencies[max(index, 0)]
+
+def parse_target(value):
+    name, _, url = value.partition('=')
+    if not url:
+        raise argparse.ArgumentTypeError('use nome=url, ex.: async=http://localhost:5001')
+    parts = urlsplit(url)
+    return name, parts.hostname, parts.port or 80
+
+def parse_ids(value):
+    start, _, end = value.partition('-')
+    return int(start), int(end or start)
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('conexao fechada pelo servidor')
+    version, status = status_line.split(b' ', 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif int(status) not in (204, 304):
+        await reader.read()
+        return int(status), False
+
+    keep_alive = version == b'HTTP/1.1' and headers.get('connection') != 'close'
+    return int(status), keep_alive
+
+async def worker(host, port, paths, ids, deadline, timeout, stats):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        if ids:
+            path = path.replace('{id}', str(random.randint(*ids)))
+        request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode()
+
+        start = time.perf_counter()
+        try:
+            # O servidor de desenvolvimento do Flask responde em HTTP/1.0 e
+            # fecha a conexao; a reconexao entra na latencia medida
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            writer.write(request)
+            status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            stats.latencies.append((time.perf_counter() - start) * 1000)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        except asyncio.TimeoutError:
+            stats.latencies.append((time.perf_counter() - start) * 1000)
+            stats.add_error('timeout')
+            keep_alive = False
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            stats.add_error(type(e).__name__)
+            keep_alive = False
+
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+async def run_target(host, port, args, duration):
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        worker(host, port, args.path, args.ids, deadline, args.timeout, stats)
+        for _ in range(args.concurrency)
+    ))
+    stats.latencies.sort()
+    return stats
+
+def report(name, stats, duration):
+    total = len(stats.latencies) - stats.errors.get('timeout', 0)
+    line = f"{name:<8} {total:>9} {total / duration:>10.1f}"
+    for percentile in PERCENTILES:
+        line += f" {stats.percentile(percentile):>9.1f}"
+    line += f" {stats.latencies[-1] if stats.latencies else 0:>9.1f}"
+    non_ok = {status: count for status, count in stats.statuses.items() if status not in (200, 304)}
+    problems = ', '.join(f'{kind}={count}' for kind, count in {**non_ok, **stats.errors}.items())
+    print(line + (f"  {problems}" if problems else ''))
+
+async def main():
+    parser = argparse.ArgumentParser(description='Benchmark das APIs sincrona e assincrona de tasks')
+    parser.add_argument('--target', action='append', type=parse_target,
+                        help='nome=url (padrao: sync=http://localhost:5000 e async=http://localhost:5001)')
+    parser.add_argument('--path', action='append', help="rota requisitada (repetivel; '{id}' e sorteado de --ids)")
+    parser.add_argument('--ids', type=parse_ids, help='intervalo de ids para {id}, ex.: 1-5000')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    targets = args.target or [parse_target('sync=http://localhost:5000'), parse_target('async=http://localhost:5001')]
+    args.path = args.path or ['/tasks']
+
+    print(f"concorrencia={args.concurrency} duracao={args.duration}s rotas={', '.join(args.path)}")
+    header = f"{'alvo':<8} {'reqs':>9} {'reqs/s':>10}"
+    for percentile in PERCENTILES:
+        header += f" {'p' + format(percentile, 'g') + ' ms':>9}"
+    print(header + f" {'max ms':>9}")
+
+    for name, host, port in targets:
+        if args.warmup > 0:
+            await run_target(host, port, args, args.warmup)
+        report(name, await run_target(host, port, args, args.duration), args.duration)
+
+if __name__ == '__main__':
+    asyncio.run(main())
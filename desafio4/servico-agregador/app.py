@@ -1,15 +1,13 @@
 from flask import Flask, jsonify
 import logging
+import logs
 import requests
 from datetime import datetime
 import os
 
 app = Flask(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logs.setup_logging('servico-agregador')
 logger = logging.getLogger(__name__)
 
 USERS_SERVICE_URL = os.getenv('USERS_SERVICE_URL', 'http://servico-usuarios:5001')
@@ -20,7 +18,7 @@ def calculate_days_active(created_at_str):
         days_active = (datetime.now() - created_date).days
         return days_active
     except Exception as e:
-        logger.error(f"Erro ao calcular dias ativos: {str(e)}")
+        logger.error("Erro ao calcular dias ativos: %s", e)
         return 0
 
 def get_status_badge(days_active):
@@ -67,7 +65,7 @@ def health():
 @app.route('/users/summary', methods=['GET'])
 def get_users_summary():
     try:
-        logger.info(f"Chamando servico de usuarios: {USERS_SERVICE_URL}/users")
+        logger.info("Chamando servico de usuarios: %s/users", USERS_SERVICE_URL)
         
         response = requests.get(f"{USERS_SERVICE_URL}/users", timeout=5)
         
@@ -97,7 +95,7 @@ def get_users_summary():
             }
             enriched_users.append(enriched_user)
         
-        logger.info(f"Processados {len(enriched_users)} usuarios com informacoes agregadas")
+        logger.info("Processados %s usuarios com informacoes agregadas", len(enriched_users))
         
         return jsonify({
             'service': 'aggregator-service',
@@ -120,7 +118,7 @@ def get_users_summary():
         }), 504
     
     except Exception as e:
-        logger.error(f"Erro inesperado: {str(e)}")
+        logger.error("Erro inesperado: %s", e)
         return jsonify({
             'error': 'Internal server error',
             'details': str(e)
@@ -129,7 +127,7 @@ def get_users_summary():
 @app.route('/users/<int:user_id>/summary', methods=['GET'])
 def get_user_summary(user_id):
     try:
-        logger.info(f"Chamando servico de usuarios: {USERS_SERVICE_URL}/users/{user_id}")
+        logger.info("Chamando servico de usuarios: %s/users/%s", USERS_SERVICE_URL, user_id)
         
         response = requests.get(f"{USERS_SERVICE_URL}/users/{user_id}", timeout=5)
         
@@ -164,7 +162,7 @@ def get_user_summary(user_id):
             'summary': f"{user['name']} ({user['role']}) - {status_badge} - {days_active} dias na plataforma"
         }
         
-        logger.info(f"Usuario {user_id} processado com informacoes agregadas")
+        logger.info("Usuario %s processado com informacoes agregadas", user_id)
         
         return jsonify({
             'service': 'aggregator-service',
@@ -179,7 +177,7 @@ def get_user_summary(user_id):
         }), 503
     
     except Exception as e:
-        logger.error(f"Erro inesperado: {str(e)}")
+        logger.error("Erro inesperado: %s", e)
         return jsonify({
             'error': 'Internal server error',
             'details': str(e)
@@ -226,7 +224,7 @@ def get_stats():
         }), 200
     
     except Exception as e:
-        logger.error(f"Erro ao gerar estatisticas: {str(e)}")
+        logger.error("Erro ao gerar estatisticas: %s", e)
         return jsonify({
             'error': 'Failed to generate stats',
             'details': str(e)
@@ -234,5 +232,5 @@ def get_stats():
 
 if __name__ == '__main__':
     logger.info("Iniciando Aggregator Microservice na porta 5002")
-    logger.info(f"Users Service URL: {USERS_SERVICE_URL}")
+    logger.info("Users Service URL: %s", USERS_SERVICE_URL)
     app.run(host='0.0.0.0', port=5002, debug=False)
\ No newline at end of file
@@ -1,14 +1,12 @@
 from flask import Flask, jsonify
 import logging
+import logs
 from datetime import datetime, timedelta
 import random
 
 app = Flask(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logs.setup_logging('servico-usuarios')
 logger = logging.getLogger(__name__)
 
 users_database = [
@@ -71,7 +69,7 @@ def health():
 
 @app.route('/users', methods=['GET'])
 def get_users():
-    logger.info(f"Requisicao recebida: GET /users")
+    logger.info("Requisicao recebida: GET /users")
     
     return jsonify({
         'service': 'users-service',
@@ -81,7 +79,7 @@ def get_users():
 
 @app.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    logger.info(f"Requisicao recebida: GET /users/{user_id}")
+    logger.info("Requisicao recebida: GET /users/%s", user_id)
     
     user = next((u for u in users_database if u['id'] == user_id), None)
     
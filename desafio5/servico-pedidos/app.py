@@ -1,14 +1,12 @@
 from flask import Flask, jsonify, request
 import logging
+import logs
 from datetime import datetime, timedelta
 import random
 
 app = Flask(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logs.setup_logging('servico-pedidos')
 logger = logging.getLogger(__name__)
 
 orders_database = [
@@ -61,7 +59,7 @@ orders_database = [
 
 @app.route('/orders', methods=['GET'])
 def get_orders():
-    logger.info(f"GET /orders - IP: {request.remote_addr}")
+    logger.info("GET /orders - IP: %s", request.remote_addr)
     
     user_id = request.args.get('user_id', type=int)
     status_filter = request.args.get('status')
@@ -89,7 +87,7 @@ def get_orders():
 
 @app.route('/orders/<int:order_id>', methods=['GET'])
 def get_order(order_id):
-    logger.info(f"GET /orders/{order_id} - IP: {request.remote_addr}")
+    logger.info("GET /orders/%s - IP: %s", order_id, request.remote_addr)
     
     order = next((o for o in orders_database if o['id'] == order_id), None)
     
@@ -107,7 +105,7 @@ def get_order(order_id):
 
 @app.route('/orders/stats', methods=['GET'])
 def get_stats():
-    logger.info(f"GET /orders/stats - IP: {request.remote_addr}")
+    logger.info("GET /orders/stats - IP: %s", request.remote_addr)
     
     total_orders = len(orders_database)
     total_revenue = sum(order['total'] for order in orders_database)
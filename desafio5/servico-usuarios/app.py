@@ -1,13 +1,11 @@
 from flask import Flask, jsonify, request
 import logging
+import logs
 from datetime import datetime, timedelta
 
 app = Flask(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+logs.setup_logging('servico-usuarios')
 logger = logging.getLogger(__name__)
 
 users_database = [
@@ -47,7 +45,7 @@ users_database = [
 
 @app.route('/users', methods=['GET'])
 def get_users():
-    logger.info(f"GET /users - IP: {request.remote_addr}")
+    logger.info("GET /users - IP: %s", request.remote_addr)
     
     status_filter = request.args.get('status')
     
@@ -68,7 +66,7 @@ def get_users():
 
 @app.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    logger.info(f"GET /users/{user_id} - IP: {request.remote_addr}")
+    logger.info("GET /users/%s - IP: %s", user_id, request.remote_addr)
     
     user = next((u for u in users_database if u['id'] == user_id), None)
     